@@ -0,0 +1,293 @@
+"""Headless JSON API over BankSystem.
+
+A small HTTP/1.1 server built on asyncio streams. Each login returns a bearer
+token; every later request names its session with ``Authorization: Bearer
+<token>``. Blocking work (bcrypt, SQLite, report building) runs on a thread pool
+so the event loop keeps accepting connections, and requests for different
+accounts run in parallel under BankSystem's per-account locks.
+
+    python api_server.py --host 127.0.0.1 --port 8080
+
+Routes (JSON bodies, JSON responses):
+    POST /login {account_number, password}       GET  /account
+    POST /logout                                 GET  /history?limit=&before_date=&before_id=
+    POST /deposit {amount}                       POST /withdraw {amount}
+    POST /transfer {to_account, amount}
+    GET  /admin/users?after=&limit=              POST /admin/unlock {account_number}
+    POST /admin/delete {account_number}          POST /admin/interest
+    GET  /admin/interest-rate                    PUT  /admin/interest-rate {rate}
+    GET  /admin/audit?limit=&before_timestamp=&before_id=&action=&admin=&target=
+    GET  /admin/audit/export?action=&admin=&target= (streamed CSV)
+    GET  /admin/analytics?days=
+    GET  /metrics (Prometheus text, only with --metrics)
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import database_manager as db
+import metrics
+from backend_logic import BankSystem
+
+MAX_BODY_BYTES = 1 << 20
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class StreamingResponse:
+    """A response body produced by an async iterator of text chunks, sent with chunked encoding."""
+    def __init__(self, content_type, chunks):
+        self.content_type = content_type
+        self.chunks = chunks
+
+def _json_default(value):
+    if isinstance(value, Decimal): return str(value)
+    if hasattr(value, "isoformat"): return value.isoformat()
+    raise TypeError(f"Cannot serialise {type(value).__name__}")
+
+class BankApiServer:
+    def __init__(self, bank_system, workers=8, expose_metrics=False):
+        self.bank = bank_system
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bank-api")
+        self.routes = {
+            ("POST", "/login"): self.login,
+            ("POST", "/logout"): self.logout,
+            ("GET", "/account"): self.account,
+            ("GET", "/history"): self.history,
+            ("POST", "/deposit"): self.deposit,
+            ("POST", "/withdraw"): self.withdraw,
+            ("POST", "/transfer"): self.transfer,
+            ("GET", "/admin/users"): self.admin_users,
+            ("POST", "/admin/unlock"): self.admin_unlock,
+            ("POST", "/admin/delete"): self.admin_delete,
+            ("POST", "/admin/interest"): self.admin_apply_interest,
+            ("GET", "/admin/interest-rate"): self.admin_get_rate,
+            ("PUT", "/admin/interest-rate"): self.admin_set_rate,
+            ("GET", "/admin/audit"): self.admin_audit,
+            ("GET", "/admin/audit/export"): self.admin_audit_export,
+            ("GET", "/admin/analytics"): self.admin_analytics,
+        }
+        if expose_metrics: self.routes[("GET", "/metrics")] = self.metrics_text
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: func(*args, **kwargs))
+    async def _call(self, session, func, *args):
+        return await self._run(func, *args, user=session.account)
+    @staticmethod
+    def _token(headers):
+        return headers.get("authorization", "").removeprefix("Bearer ").strip()
+    def _session(self, headers, admin=False):
+        session = self.bank.get_session(self._token(headers))
+        if session is None: raise ApiError(HTTPStatus.UNAUTHORIZED, "Missing or expired session token.")
+        if admin and session.account.role != 'admin': raise ApiError(HTTPStatus.FORBIDDEN, "Administrator access required.")
+        return session
+    @staticmethod
+    def _amount(body, key="amount"):
+        try: value = float(body[key])
+        except (KeyError, TypeError, ValueError): raise ApiError(HTTPStatus.BAD_REQUEST, f"'{key}' must be a number.")
+        if not math.isfinite(value): raise ApiError(HTTPStatus.BAD_REQUEST, f"'{key}' must be a finite number.")
+        return value
+    @staticmethod
+    def _limit(query):
+        # Page sizes are clamped to 1..1000: zero or a negative LIMIT would skip pagination.
+        return max(1, min(int(query.get("limit", ["100"])[0]), 1000))
+    @staticmethod
+    def _field(body, key):
+        value = body.get(key)
+        if not isinstance(value, str) or not value: raise ApiError(HTTPStatus.BAD_REQUEST, f"'{key}' is required.")
+        return value
+
+    async def login(self, headers, query, body):
+        acc_number, password = self._field(body, "account_number"), self._field(body, "password")
+        status, session, alert = await self._run(self.bank.open_session, acc_number, password)
+        if not session: raise ApiError(HTTPStatus.UNAUTHORIZED, status)
+        return {"message": status, "token": session.token, "alert": alert}
+    async def logout(self, headers, query, body):
+        self._session(headers)
+        self.bank.close_session(self._token(headers))
+        return {"message": "Logged out."}
+    async def account(self, headers, query, body):
+        session = self._session(headers)
+        acc = await self._call(session, self.bank.get_current_user_details)
+        return {"account_number": acc.account_number, "name": acc.name, "balance": acc.balance,
+                "role": acc.role, "locked": acc.is_locked}
+    async def history(self, headers, query, body):
+        session = self._session(headers)
+        limit = self._limit(query)
+        before = None
+        if "before_date" in query and "before_id" in query:
+            before = (query["before_date"][0], int(query["before_id"][0]))
+        rows, next_before = await self._run(session.account.transactions.keyed_page, before, limit)
+        return {"transactions": [{"id": t_id, "date": t[0], "type": t[1], "amount": t[2], "balance": t[3]} for t_id, t in rows],
+                "next": {"before_date": next_before[0], "before_id": next_before[1]} if next_before else None}
+    async def deposit(self, headers, query, body):
+        return {"message": await self._call(self._session(headers), self.bank.deposit, self._amount(body))}
+    async def withdraw(self, headers, query, body):
+        return {"message": await self._call(self._session(headers), self.bank.withdraw, self._amount(body))}
+    async def transfer(self, headers, query, body):
+        session = self._session(headers)
+        return {"message": await self._call(session, self.bank.transfer_funds, self._field(body, "to_account"), self._amount(body))}
+    async def admin_users(self, headers, query, body):
+        self._session(headers, admin=True)
+        limit = self._limit(query)
+        users, next_after = await self._run(self.bank.admin_get_users_page, query.get("after", [None])[0], limit)
+        return {"users": [{"account_number": acc, "name": name, "balance": balance, "locked": locked}
+                          for acc, name, balance, locked in users], "next_after": next_after}
+    async def admin_unlock(self, headers, query, body):
+        session = self._session(headers, admin=True)
+        return {"message": await self._call(session, self.bank.admin_unlock_account, self._field(body, "account_number"))}
+    async def admin_delete(self, headers, query, body):
+        session = self._session(headers, admin=True)
+        return {"message": await self._call(session, self.bank.admin_delete_account, self._field(body, "account_number"))}
+    async def admin_apply_interest(self, headers, query, body):
+        return {"message": await self._call(self._session(headers, admin=True), self.bank.admin_apply_interest)}
+    async def admin_get_rate(self, headers, query, body):
+        self._session(headers, admin=True)
+        return {"rate": await self._run(self.bank.get_interest_rate)}
+    async def admin_set_rate(self, headers, query, body):
+        session = self._session(headers, admin=True)
+        rate = self._amount(body, "rate")
+        if rate <= 0: raise ApiError(HTTPStatus.BAD_REQUEST, "'rate' must be positive.")
+        await self._call(session, self.bank.set_interest_rate, rate)
+        return {"rate": rate}
+    @staticmethod
+    def _audit_filters(query):
+        return {key: query[name][0] for name, key in (("action", "action"), ("admin", "admin_user"), ("target", "target_user")) if name in query}
+    async def admin_audit(self, headers, query, body):
+        self._session(headers, admin=True)
+        limit = self._limit(query)
+        before = None
+        if "before_timestamp" in query and "before_id" in query:
+            before = (query["before_timestamp"][0], int(query["before_id"][0]))
+        logs, next_before = await self._run(self.bank.admin_get_audit_page, before, limit, **self._audit_filters(query))
+        keys = ("timestamp", "admin_user", "action", "target_user", "details")
+        return {"entries": [{"id": log_id, **dict(zip(keys, log))} for log_id, log in logs],
+                "next": {"before_timestamp": next_before[0], "before_id": next_before[1]} if next_before else None}
+    async def admin_audit_export(self, headers, query, body):
+        self._session(headers, admin=True)
+        filters = self._audit_filters(query)
+        async def chunks():
+            yield "timestamp,admin_user,action,target_user,details\r\n"
+            before = None
+            while True:
+                logs, before = await self._run(self.bank.admin_get_audit_page, before, 1000, **filters)
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(log for _, log in logs)
+                yield buffer.getvalue()
+                if before is None: return
+        return StreamingResponse("text/csv", chunks())
+    async def admin_analytics(self, headers, query, body):
+        self._session(headers, admin=True)
+        days = min(max(int(query.get("days", ["30"])[0]), 1), 366)
+        metrics = await self._run(self.bank.admin_get_analytics, days)
+        return {**metrics, "top_accounts": [{"account_number": acc, "name": name, "balance": balance} for acc, name, balance in metrics["top_accounts"]],
+                "by_type": [{"type": t_type, "count": count, "total": total} for t_type, count, total in metrics["by_type"]],
+                "daily_flows": [{"day": day, "inflow": inflow, "outflow": outflow, "net": net} for day, inflow, outflow, net in metrics["daily_flows"]],
+                "histogram": [{"low": low, "high": high, "accounts": count} for low, high, count in metrics["histogram"]]}
+    async def metrics_text(self, headers, query, body):
+        return metrics.prometheus_text()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line: break
+                try: method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, HTTPStatus.BAD_REQUEST, {"error": "Malformed request line."}, False)
+                    break
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                status, payload = await self._dispatch(method, target, headers, reader)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive: break
+        except (ConnectionError, asyncio.IncompleteReadError): pass
+        finally:
+            writer.close()
+    async def _dispatch(self, method, target, headers, reader):
+        try:
+            length = int(headers.get("content-length", "0"))
+            if length > MAX_BODY_BYTES: raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large.")
+            raw = await reader.readexactly(length) if length else b""
+            url = urlsplit(target)
+            handler = self.routes.get((method, url.path))
+            if handler is None: raise ApiError(HTTPStatus.NOT_FOUND, f"No route for {method} {url.path}.")
+            try: body = json.loads(raw) if raw else {}
+            except ValueError: raise ApiError(HTTPStatus.BAD_REQUEST, "Body must be JSON.")
+            if not isinstance(body, dict): raise ApiError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object.")
+            return HTTPStatus.OK, await handler(headers, parse_qs(url.query), body)
+        except ApiError as e:
+            return e.status, {"error": e.message}
+        except ValueError as e:
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except Exception as e:
+            print(f"API error on {method} {target}: {e}")
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Internal server error."}
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive):
+        if isinstance(payload, StreamingResponse):
+            writer.write((f"HTTP/1.1 {status.value} {status.phrase}\r\nContent-Type: {payload.content_type}\r\n"
+                          f"Transfer-Encoding: chunked\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode("latin-1"))
+            try:
+                async for chunk in payload.chunks:
+                    data = chunk.encode()
+                    if data: writer.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                    await writer.drain()
+            except (ConnectionError, asyncio.CancelledError): raise
+            except Exception as e:
+                # Headers are already sent; dropping the connection tells the client the body is incomplete.
+                print(f"API error while streaming: {e}")
+                writer.close()
+                return
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+            return
+        if isinstance(payload, str): body, content_type = payload.encode(), "text/plain; version=0.0.4"
+        else: body, content_type = json.dumps(payload, default=_json_default).encode(), "application/json"
+        head = (f"HTTP/1.1 {status.value} {status.phrase}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Bank API listening on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the bank over a JSON HTTP API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=8, help="Threads for blocking backend work.")
+    parser.add_argument("--metrics", action="store_true", help="Record latency metrics and serve them at GET /metrics.")
+    parser.add_argument("--group-commit", action="store_true", help="Batch concurrent postings into shared durable commits.")
+    parser.add_argument("--shards", type=int, help="Spread accounts over this many database files (only for a new database).")
+    args = parser.parse_args()
+    if args.shards: db.SHARDS = args.shards
+    if args.group_commit: db.start_group_commit()
+    if args.metrics: metrics.enable()
+    metrics.configure_from_env()
+    server = BankApiServer(BankSystem(), args.workers, expose_metrics=args.metrics)
+    try: asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt: pass
+    finally:
+        server.executor.shutdown(wait=False, cancel_futures=True)
+        db.stop_group_commit()
+
+if __name__ == "__main__":
+    main()
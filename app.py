@@ -1,76 +1,217 @@
 import tkinter as tk
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
-from tkinter import messagebox, simpledialog
+from tkinter import filedialog, messagebox, simpledialog
 from backend_logic import BankSystem
+import metrics
 import webbrowser
 import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
 
 class BankApp(ttk.Window):
-    def __init__(self, bank_system):
+    TASK_POLL_MS = 50
+    def __init__(self, bank_system=None):
         super().__init__(themename="litera")
         self.bank_system = bank_system
         self.title("Bank Management System")
         self.geometry("800x600")
+        # Backend calls (bcrypt, SQLite, report building) run on a single worker thread
+        # so the Tk main loop stays responsive; results come back through after().
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bank-backend")
+        self.pending_tasks = 0
+        self.status_bar = ttk.Frame(self, padding=(10, 2))
+        self.status_bar.pack(side="bottom", fill=X)
+        self.status_label = ttk.Label(self.status_bar, text="")
+        self.status_label.pack(side=LEFT)
+        self.busy_bar = ttk.Progressbar(self.status_bar, mode="indeterminate", length=150, bootstyle="info-striped")
         self.container = ttk.Frame(self, padding=10)
         self.container.pack(side="top", fill="both", expand=True)
         self.container.grid_rowconfigure(0, weight=1)
         self.container.grid_columnconfigure(0, weight=1)
+        # Screens are built the first time they are shown.
         self.frames = {}
-        for F in (LoginScreen, UserDashboardScreen, AdminDashboardScreen, CreateAccountScreen):
-            frame = F(parent=self.container, controller=self)
-            self.frames[F.__name__] = frame
-            frame.grid(row=0, column=0, sticky="nsew")
         self.show_frame("LoginScreen")
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        # Accounts load on the backend thread while the login screen is up; tasks queued
+        # behind it (such as signing in) run once it is done.
+        if bank_system is None: self.run_task(self._load_bank_system, message="Loading accounts...")
+    def _load_bank_system(self):
+        self.bank_system = BankSystem()
+    def frame(self, page_name):
+        frame = self.frames.get(page_name)
+        if frame is None:
+            screens = {F.__name__: F for F in (LoginScreen, UserDashboardScreen, AdminDashboardScreen, CreateAccountScreen)}
+            frame = self.frames[page_name] = screens[page_name](parent=self.container, controller=self)
+            frame.grid(row=0, column=0, sticky="nsew")
+        return frame
     def show_frame(self, page_name, data=None):
-        frame = self.frames[page_name]
+        frame = self.frame(page_name)
         if hasattr(frame, "on_show"):
             frame.on_show(data)
         frame.tkraise()
-    def handle_login(self, acc_number, password):
-        status, account, alert = self.bank_system.login(acc_number, password)
-        if account:
-            if alert: messagebox.showwarning("Alert", alert)
-            if account.role == 'admin': self.show_frame("AdminDashboardScreen")
-            else: self.show_frame("UserDashboardScreen")
+    def run_task(self, func, *args, on_done=None, message="Working..."):
+        """Run ``func(*args)`` on the backend thread and pass its result to ``on_done`` on the UI thread."""
+        future = self.executor.submit(func, *args)
+        self._set_busy(1, message)
+        self.after(self.TASK_POLL_MS, self._poll_task, future, on_done)
+    def _poll_task(self, future, on_done):
+        if not future.done():
+            self.after(self.TASK_POLL_MS, self._poll_task, future, on_done)
+            return
+        self._set_busy(-1)
+        try: result = future.result()
+        except Exception as e:
+            messagebox.showerror("Error", f"Operation failed: {e}")
+            return
+        if on_done: on_done(result)
+    def _set_busy(self, delta, message=""):
+        self.pending_tasks += delta
+        if self.pending_tasks > 0:
+            if delta > 0: self.status_label.config(text=message)
+            self.busy_bar.pack(side=RIGHT)
+            self.busy_bar.start(10)
+            self.config(cursor="watch")
         else:
-            messagebox.showerror("Login Failed", status)
-        
+            self.busy_bar.stop()
+            self.busy_bar.pack_forget()
+            self.status_label.config(text="")
+            self.config(cursor="")
+    def on_close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.destroy()
+    def handle_login(self, acc_number, password):
+        def done(result):
+            status, account, alert = result
+            if account:
+                if alert: messagebox.showwarning("Alert", alert)
+                if account.role == 'admin': self.show_frame("AdminDashboardScreen")
+                else: self.show_frame("UserDashboardScreen")
+            else:
+                messagebox.showerror("Login Failed", status)
+        self.run_task(lambda: self.bank_system.login(acc_number, password), on_done=done, message="Signing in...")
     def handle_logout(self):
-        self.bank_system.logout()
-        self.show_frame("LoginScreen")
+        # Queued behind any pending backend work so it cannot race a running task.
+        self.run_task(self.bank_system.logout, on_done=lambda _: self.show_frame("LoginScreen"), message="Signing out...")
+    def handle_create_account(self, name, acc_number, password, balance):
+        def done(status):
+            messagebox.showinfo("Account Creation Status", status)
+            if "successfully" in status: self.show_frame("LoginScreen")
+        self.run_task(lambda: self.bank_system.create_account(name, acc_number, password, balance), on_done=done, message="Creating account...")
+    def _show_status_and_refresh(self, title, refresh=None):
+        def done(status):
+            messagebox.showinfo(title, status)
+            if refresh: refresh()
+        return done
     def handle_deposit(self, amount):
-        status = self.bank_system.deposit(amount)
-        messagebox.showinfo("Deposit Status", status)
-        self.frames["UserDashboardScreen"].on_show()
+        self.run_task(self.bank_system.deposit, amount, on_done=self._show_status_and_refresh("Deposit Status", self.frame("UserDashboardScreen").refresh), message="Processing deposit...")
     def handle_withdraw(self, amount):
-        status = self.bank_system.withdraw(amount)
-        messagebox.showinfo("Withdrawal Status", status)
-        self.frames["UserDashboardScreen"].on_show()
+        self.run_task(self.bank_system.withdraw, amount, on_done=self._show_status_and_refresh("Withdrawal Status", self.frame("UserDashboardScreen").refresh), message="Processing withdrawal...")
     def handle_transfer(self, to_acc, amount):
-        status = self.bank_system.transfer_funds(to_acc, amount)
-        messagebox.showinfo("Transfer Status", status)
-        self.frames["UserDashboardScreen"].on_show()
+        self.run_task(self.bank_system.transfer_funds, to_acc, amount, on_done=self._show_status_and_refresh("Transfer Status", self.frame("UserDashboardScreen").refresh), message="Processing transfer...")
     def handle_update_name(self, new_name):
-        status = self.bank_system.update_user_name(new_name)
-        messagebox.showinfo("Update Status", status)
-        self.frames["UserDashboardScreen"].on_show()
+        self.run_task(self.bank_system.update_user_name, new_name, on_done=self._show_status_and_refresh("Update Status", self.frame("UserDashboardScreen").refresh_summary), message="Updating name...")
     def handle_update_password(self, old_p, new_p):
-        status = self.bank_system.update_user_password(old_p, new_p)
-        messagebox.showinfo("Update Status", status)
+        self.run_task(self.bank_system.update_user_password, old_p, new_p, on_done=self._show_status_and_refresh("Update Status"), message="Updating password...")
+    def handle_generate_report(self, report_type, account, period):
+        def done(file_path):
+            messagebox.showinfo("Success", f"Generated {file_path}")
+            if report_type == "PDF": webbrowser.open(os.path.abspath(file_path))
+        build = account.generate_statement if report_type == "PDF" else account.export_to_csv
+        self.run_task(build, *period, on_done=done, message=f"Generating {report_type}...")
     def handle_admin_delete_user(self, acc_to_delete):
         if messagebox.askyesno("Confirm Deletion", f"Are you sure you want to permanently delete account {acc_to_delete}?"):
-            status = self.bank_system.admin_delete_account(acc_to_delete)
-            messagebox.showinfo("Delete Status", status)
-            self.frames["AdminDashboardScreen"].on_show()
+            def done(status):
+                messagebox.showinfo("Delete Status", status)
+                if "deleted successfully" in status: self.frame("AdminDashboardScreen").mark_deleted(acc_to_delete)
+            self.run_task(self.bank_system.admin_delete_account, acc_to_delete, on_done=done, message="Deleting account...")
     def handle_admin_unlock_user(self, acc_to_unlock):
-        status = self.bank_system.admin_unlock_account(acc_to_unlock)
-        messagebox.showinfo("Unlock Status", status)
-        self.frames["AdminDashboardScreen"].on_show()
+        def done(status):
+            messagebox.showinfo("Unlock Status", status)
+            if "has been unlocked" in status: self.frame("AdminDashboardScreen").mark_unlocked(acc_to_unlock)
+        self.run_task(self.bank_system.admin_unlock_account, acc_to_unlock, on_done=done, message="Unlocking account...")
     def handle_admin_apply_interest(self):
         if messagebox.askyesno("Confirm Interest Application", "Apply annual interest to all accounts? This cannot be undone."):
-            status = self.bank_system.admin_apply_interest()
-            messagebox.showinfo("Status", status)
+            self.run_task(self.bank_system.admin_apply_interest, on_done=self._show_status_and_refresh("Status", self.frame("AdminDashboardScreen").on_show), message="Applying interest to all accounts...")
+    def handle_admin_export_audit_log(self, path, filters):
+        export = lambda: self.bank_system.admin_export_audit_log(path, **filters)
+        self.run_task(export, on_done=self._show_status_and_refresh("Export Status", self.frame("AdminDashboardScreen").audit_list.refresh_head), message="Exporting audit log...")
+    def handle_admin_backup(self):
+        self.run_task(self.bank_system.admin_backup_database, on_done=self._show_status_and_refresh("Backup", self.frame("AdminDashboardScreen").on_show), message="Backing up database...")
+    def handle_admin_set_interest_rate(self, rate):
+        self.run_task(self.bank_system.set_interest_rate, rate, on_done=lambda _: self.frame("AdminDashboardScreen").on_show(), message="Updating interest rate...")
+
+class PagedTreeview(ttk.Frame):
+    """Treeview that loads rows a page at a time as the user scrolls towards the end.
+
+    ``fetch_page(cursor, limit)`` returns ``(rows, next_cursor)`` where each row is a
+    ``(key, values)`` pair and ``next_cursor`` is None after the last page. Rows are
+    keyed so callers can apply incremental updates instead of rebuilding the list.
+    """
+    LOAD_THRESHOLD = 0.9
+    def __init__(self, parent, columns, fetch_page, page_size=100, bootstyle="primary"):
+        super().__init__(parent)
+        self.fetch_page = fetch_page
+        self.page_size = page_size
+        self.next_cursor = None
+        self.loading = False
+        self.tree = ttk.Treeview(self, columns=columns, show='headings', bootstyle=bootstyle)
+        for col in columns: self.tree.heading(col, text=col)
+        scrollbar = ttk.Scrollbar(self, orient=VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=lambda first, last: self._on_scroll(scrollbar, first, last))
+        scrollbar.pack(side=RIGHT, fill=Y)
+        self.tree.pack(side=LEFT, expand=True, fill="both")
+    def _on_scroll(self, scrollbar, first, last):
+        scrollbar.set(first, last)
+        if float(last) >= self.LOAD_THRESHOLD and self.next_cursor is not None and not self.loading:
+            self.after_idle(self.load_more)
+    def reload(self):
+        self.tree.delete(*self.tree.get_children())
+        self.next_cursor = None
+        self._load(None)
+    def load_more(self):
+        if self.next_cursor is not None and not self.loading: self._load(self.next_cursor)
+    def _load(self, cursor):
+        self.loading = True
+        try:
+            rows, self.next_cursor = self.fetch_page(cursor, self.page_size)
+            for key, values in rows:
+                if not self.tree.exists(key): self.tree.insert("", "end", iid=key, values=values)
+        finally: self.loading = False
+    def refresh_head(self):
+        # Prepend rows that appeared at the top since the last load; rebuild only if more
+        # than a page of them arrived.
+        rows, _ = self.fetch_page(None, self.page_size)
+        new_rows = []
+        for key, values in rows:
+            if self.tree.exists(key): break
+            new_rows.append((key, values))
+        if self.tree.get_children() and len(new_rows) == len(rows) == self.page_size:
+            self.reload()
+            return
+        for index, (key, values) in enumerate(new_rows):
+            self.tree.insert("", index, iid=key, values=values)
+    def set_value(self, key, column, value):
+        if self.tree.exists(key): self.tree.set(key, column, value)
+    def remove(self, key):
+        if self.tree.exists(key): self.tree.delete(key)
+
+class LazyNotebook(ttk.Notebook):
+    """Notebook whose tabs are filled in by ``build(tab)`` the first time each one is selected."""
+    def __init__(self, parent, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.builders = {}
+        self.bind("<<NotebookTabChanged>>", self._on_tab_changed, add="+")
+    def add_tab(self, text, build=None, padding=10):
+        tab = ttk.Frame(self, padding=padding)
+        self.add(tab, text=text)
+        if build: self.builders[str(tab)] = (tab, build)
+        return tab
+    def is_built(self, tab):
+        return str(tab) not in self.builders
+    def _on_tab_changed(self, event):
+        tab, build = self.builders.pop(self.select(), (None, None))
+        if build: build(tab)
 
 class LoginScreen(ttk.Frame):
     def __init__(self, parent, controller):
@@ -117,9 +258,7 @@ class CreateAccountScreen(ttk.Frame):
             acc_number = self.entries["Account Number:"].get()
             password = self.entries["Password:"].get()
             balance = float(self.entries["Initial Deposit:"].get())
-            status = self.controller.bank_system.create_account(name, acc_number, password, balance)
-            messagebox.showinfo("Account Creation Status", status)
-            if "successfully" in status: self.controller.show_frame("LoginScreen")
+            self.controller.handle_create_account(name, acc_number, password, balance)
         except ValueError: messagebox.showerror("Error", "Initial Deposit must be a valid number.")
 
 class UserDashboardScreen(ttk.Frame):
@@ -131,20 +270,15 @@ class UserDashboardScreen(ttk.Frame):
         self.welcome_label = ttk.Label(header_frame, text="Welcome, User", font="-size 18")
         self.welcome_label.pack(side=LEFT)
         ttk.Button(header_frame, text="Logout", command=lambda: controller.handle_logout(), bootstyle="secondary-outline").pack(side=RIGHT)
-        self.notebook = ttk.Notebook(self, bootstyle="primary")
+        self.notebook = LazyNotebook(self, bootstyle="primary")
         self.notebook.pack(expand=True, fill="both")
-        self.summary_tab = ttk.Frame(self.notebook, padding=10)
-        self.history_tab = ttk.Frame(self.notebook, padding=10)
-        self.transfer_tab = ttk.Frame(self.notebook, padding=10)
-        self.profile_tab = ttk.Frame(self.notebook, padding=10)
-        self.utils_tab = ttk.Frame(self.notebook, padding=10)
-        self.notebook.add(self.summary_tab, text="Summary")
-        self.notebook.add(self.history_tab, text="Transaction History")
-        self.notebook.add(self.transfer_tab, text="Transfer Funds")
-        self.notebook.add(self.profile_tab, text="My Profile")
-        self.notebook.add(self.utils_tab, text="Utilities")
-        self._populate_tabs()
-    def _populate_tabs(self):
+        self.summary_tab = self.notebook.add_tab("Summary")
+        self.history_tab = self.notebook.add_tab("Transaction History", self._build_history_tab)
+        self.transfer_tab = self.notebook.add_tab("Transfer Funds", self._build_transfer_tab)
+        self.profile_tab = self.notebook.add_tab("My Profile", self._build_profile_tab)
+        self.utils_tab = self.notebook.add_tab("Utilities", self._build_utils_tab)
+        self._build_summary_tab(self.summary_tab)
+    def _build_summary_tab(self, tab):
         self.details_label = ttk.Label(self.summary_tab, text="", font="-family Courier -size 12", justify=LEFT)
         self.details_label.pack(pady=20, padx=20, anchor="w")
         btn_frame = ttk.Frame(self.summary_tab)
@@ -153,10 +287,13 @@ class UserDashboardScreen(ttk.Frame):
         ttk.Button(btn_frame, text="Withdraw", command=self.withdraw_popup, bootstyle="danger").pack(side="left", padx=10)
         ttk.Button(btn_frame, text="Generate PDF", command=lambda: self.generate_report("PDF"), bootstyle="info-outline").pack(side="left", padx=10)
         ttk.Button(btn_frame, text="Export CSV", command=lambda: self.generate_report("CSV"), bootstyle="info-outline").pack(side="left", padx=10)
+    def _build_history_tab(self, tab):
         cols = ("Date", "Type", "Amount", "Balance")
-        self.tree = ttk.Treeview(self.history_tab, columns=cols, show='headings', bootstyle="primary")
-        for col in cols: self.tree.heading(col, text=col)
-        self.tree.pack(expand=True, fill="both")
+        self.history_list = PagedTreeview(self.history_tab, cols, self._fetch_history_page)
+        self.history_list.pack(expand=True, fill="both")
+        self.tree = self.history_list.tree
+        self.history_list.reload()
+    def _build_transfer_tab(self, tab):
         ttk.Label(self.transfer_tab, text="Recipient Account No:").pack(pady=5)
         self.to_acc_entry = ttk.Entry(self.transfer_tab, width=30)
         self.to_acc_entry.pack(pady=5)
@@ -164,8 +301,10 @@ class UserDashboardScreen(ttk.Frame):
         self.transfer_amt_entry = ttk.Entry(self.transfer_tab, width=30)
         self.transfer_amt_entry.pack(pady=5)
         ttk.Button(self.transfer_tab, text="Submit Transfer", command=self.submit_transfer, bootstyle="primary").pack(pady=20)
+    def _build_profile_tab(self, tab):
         ttk.Button(self.profile_tab, text="Change Name", command=self.change_name_popup).pack(pady=10, fill=X, padx=50)
         ttk.Button(self.profile_tab, text="Change Password", command=self.change_password_popup).pack(pady=10, fill=X, padx=50)
+    def _build_utils_tab(self, tab):
         util_frame = ttk.Frame(self.utils_tab)
         util_frame.pack(pady=20)
         ttk.Label(util_frame, text="Loan EMI Calculator", font="-size 14").grid(row=0, column=0, columnspan=2, pady=10)
@@ -182,16 +321,24 @@ class UserDashboardScreen(ttk.Frame):
         self.emi_result_label = ttk.Label(util_frame, text="", font="-size 12 -weight bold", bootstyle="success")
         self.emi_result_label.grid(row=5, column=0, columnspan=2)
     def on_show(self, data=None):
-        acc = self.controller.bank_system.get_current_user_details()
-        if not acc: return
+        if self.refresh_summary() and self.notebook.is_built(self.history_tab): self.history_list.reload()
+    def refresh(self):
+        """Update after a posting: only the summary and any new history rows are redrawn."""
+        if self.refresh_summary() and self.notebook.is_built(self.history_tab): self.history_list.refresh_head()
+    def refresh_summary(self):
+        acc = self.controller.bank_system.current_user
+        if not acc: return False
         self.welcome_label.config(text=f"Welcome, {acc.name}")
         details = (f"Account Holder: {acc.name}\n"
                 f"Account Number: {acc.account_number}\n"
                 f"Current Balance: INR {acc.balance:.2f}")
         self.details_label.config(text=details)
-        for i in self.tree.get_children(): self.tree.delete(i)
-        for t in acc.transactions:
-            self.tree.insert("", "end", values=(t[0].strftime('%Y-%m-%d %H:%M'), t[1], f"{t[2]:.2f}", f"{t[3]:.2f}"))
+        return True
+    def _fetch_history_page(self, cursor, limit):
+        acc = self.controller.bank_system.current_user
+        if not acc: return [], None
+        rows, next_cursor = acc.transactions.keyed_page(cursor, limit)
+        return [(str(t_id), (t[0].strftime('%Y-%m-%d %H:%M'), t[1], f"{t[2]:.2f}", f"{t[3]:.2f}")) for t_id, t in rows], next_cursor
     def deposit_popup(self):
         amount = simpledialog.askfloat("Deposit", "Enter amount:", parent=self)
         if amount: self.controller.handle_deposit(amount)
@@ -220,16 +367,22 @@ class UserDashboardScreen(ttk.Frame):
             self.controller.handle_update_password(old_p.get(), new_p.get())
             popup.destroy()
         ttk.Button(popup, text="Submit", command=submit, bootstyle="primary").pack(pady=10)
+    def ask_statement_period(self):
+        bounds = []
+        for label in ("From", "To"):
+            value = simpledialog.askstring("Statement Period", f"{label} date (YYYY-MM-DD), blank for no limit:", parent=self)
+            if value is None: return None
+            try: bounds.append(date.fromisoformat(value.strip()) if value.strip() else None)
+            except ValueError:
+                messagebox.showerror("Error", "Dates must be in YYYY-MM-DD format.")
+                return None
+        return bounds
     def generate_report(self, report_type):
         acc = self.controller.bank_system.get_current_user_details()
         if not acc: return
-        if report_type == "PDF":
-            file_path = acc.generate_statement()
-            messagebox.showinfo("Success", f"Generated {file_path}")
-            webbrowser.open(os.path.abspath(file_path))
-        elif report_type == "CSV":
-            file_path = acc.export_to_csv()
-            messagebox.showinfo("Success", f"Generated {file_path}")
+        period = self.ask_statement_period()
+        if period is None: return
+        self.controller.handle_generate_report(report_type, acc, period)
     def calculate_emi(self):
         try:
             p = float(self.principal_entry.get())
@@ -247,27 +400,24 @@ class AdminDashboardScreen(ttk.Frame):
         header_frame.pack(fill=X, pady=(0,10))
         ttk.Label(header_frame, text="Administrator Dashboard", font="-size 18").pack(side=LEFT)
         ttk.Button(header_frame, text="Logout", command=lambda: controller.handle_logout(), bootstyle="secondary-outline").pack(side=RIGHT)
-        self.notebook = ttk.Notebook(self, bootstyle="primary")
+        self.notebook = LazyNotebook(self, bootstyle="primary")
         self.notebook.pack(pady=10, padx=10, expand=True, fill="both")
-        self.manage_tab = ttk.Frame(self.notebook, padding=10)
-        self.financials_tab = ttk.Frame(self.notebook, padding=10)
-        self.audit_tab = ttk.Frame(self.notebook, padding=10)
-        self.notebook.add(self.manage_tab, text="User Management")
-        self.notebook.add(self.financials_tab, text="System Financials")
-        self.notebook.add(self.audit_tab, text="Audit Log")
+        self.manage_tab = self.notebook.add_tab("User Management")
+        self.financials_tab = self.notebook.add_tab("System Financials", lambda tab: (self._populate_financials_tab(), self._update_financials_tab()))
+        self.analytics_tab = self.notebook.add_tab("Analytics", lambda tab: self._populate_analytics_tab())
+        self.audit_tab = self.notebook.add_tab("Audit Log", lambda tab: (self._populate_audit_tab(), self._update_audit_tab()))
         self._populate_manage_tab()
-        self._populate_financials_tab()
-        self._populate_audit_tab()
+        self.notebook.bind("<<NotebookTabChanged>>", self._on_tab_changed, add="+")
     def on_show(self, data=None):
         """Called whenever the frame is raised to the top."""
         self._update_manage_tab()
-        self._update_financials_tab()
-        self._update_audit_tab()
+        if self.notebook.is_built(self.financials_tab): self._update_financials_tab()
+        if self.notebook.is_built(self.audit_tab): self._update_audit_tab()
     def _populate_manage_tab(self):
         cols = ("Account No", "Name", "Balance", "Status")
-        self.user_tree = ttk.Treeview(self.manage_tab, columns=cols, show='headings', bootstyle="primary")
-        for col in cols: self.user_tree.heading(col, text=col)
-        self.user_tree.pack(expand=True, fill="both")
+        self.user_list = PagedTreeview(self.manage_tab, cols, self._fetch_users_page)
+        self.user_list.pack(expand=True, fill="both")
+        self.user_tree = self.user_list.tree
         btn_frame = ttk.Frame(self.manage_tab)
         btn_frame.pack(pady=10)
         ttk.Button(btn_frame, text="Unlock Selected User", command=self._unlock_selected, bootstyle="warning").pack(side="left", padx=5)
@@ -280,28 +430,101 @@ class AdminDashboardScreen(ttk.Frame):
         self.rate_label.pack(side="left")
         ttk.Button(self.financials_tab, text="Update Interest Rate", command=self._update_rate_popup, bootstyle="secondary").pack(pady=10)
         ttk.Button(self.financials_tab, text="Apply Annual Interest to All Accounts", command=lambda: self.controller.handle_admin_apply_interest(), bootstyle="primary").pack(pady=20)
+        ttk.Button(self.financials_tab, text="Back Up Database", command=lambda: self.controller.handle_admin_backup(), bootstyle="secondary-outline").pack(pady=10)
+    def _populate_analytics_tab(self):
+        summary = ttk.Frame(self.analytics_tab)
+        summary.pack(fill=X, pady=(0, 10))
+        self.analytics_labels = {}
+        for col, (key, title) in enumerate([("accounts", "Accounts"), ("locked_accounts", "Locked"), ("total_balance", "Total Balance"),
+                                            ("average_balance", "Average Balance"), ("deposits", "Deposits (30 days)")]):
+            ttk.Label(summary, text=title).grid(row=0, column=col, padx=15, sticky=W)
+            self.analytics_labels[key] = ttk.Label(summary, text="-", font="-size 12 -weight bold", bootstyle="info")
+            self.analytics_labels[key].grid(row=1, column=col, padx=15, sticky=W)
+        ttk.Button(summary, text="Refresh", command=self._update_analytics_tab, bootstyle="secondary-outline").grid(row=0, column=5, rowspan=2, padx=15)
+        tables = ttk.Frame(self.analytics_tab)
+        tables.pack(expand=True, fill="both")
+        self.analytics_trees = {}
+        for col, (key, title, columns) in enumerate([
+                ("top_accounts", "Top Accounts by Balance", ("Account No", "Name", "Balance")),
+                ("daily_flows", "Daily Flows (30 days)", ("Day", "Inflow", "Outflow", "Net")),
+                ("histogram", "Balance Distribution", ("Range", "Accounts", ""))]):
+            frame = ttk.Labelframe(tables, text=title, padding=5)
+            frame.grid(row=0, column=col, sticky=NSEW, padx=5)
+            tables.columnconfigure(col, weight=1)
+            tree = ttk.Treeview(frame, columns=columns, show='headings', bootstyle="info")
+            for column in columns:
+                tree.heading(column, text=column)
+                tree.column(column, width=90)
+            tree.pack(expand=True, fill="both")
+            self.analytics_trees[key] = tree
+        tables.rowconfigure(0, weight=1)
+    def _on_tab_changed(self, event):
+        if self.notebook.select() == str(self.analytics_tab): self._update_analytics_tab()
+    def _update_analytics_tab(self):
+        self.controller.run_task(self.controller.bank_system.admin_get_analytics, on_done=self._show_analytics, message="Loading analytics...")
+    def _show_analytics(self, metrics):
+        totals = metrics["totals"]
+        deposits = sum((total for t_type, _, total in metrics["by_type"] if t_type == "Deposit"), 0)
+        for key, text in [("accounts", str(totals["accounts"])), ("locked_accounts", str(totals["locked_accounts"])),
+                          ("total_balance", f"INR {totals['total_balance']:,.2f}"), ("average_balance", f"INR {totals['average_balance']:,.2f}"),
+                          ("deposits", f"INR {deposits:,.2f}")]:
+            self.analytics_labels[key].config(text=text)
+        for tree in self.analytics_trees.values(): tree.delete(*tree.get_children())
+        for acc_num, name, balance in metrics["top_accounts"]:
+            self.analytics_trees["top_accounts"].insert("", "end", values=(acc_num, name, f"{balance:,.2f}"))
+        for day, inflow, outflow, net in reversed(metrics["daily_flows"]):
+            self.analytics_trees["daily_flows"].insert("", "end", values=(day, f"{inflow:,.2f}", f"{outflow:,.2f}", f"{net:,.2f}"))
+        widest = max((count for _, _, count in metrics["histogram"]), default=0) or 1
+        for low, high, count in metrics["histogram"]:
+            self.analytics_trees["histogram"].insert("", "end", values=(f"{low:,.0f} - {high:,.0f}", count, "█" * round(20 * count / widest)))
     def _populate_audit_tab(self):
+        filter_frame = ttk.Frame(self.audit_tab)
+        filter_frame.pack(fill=X, pady=(0, 10))
+        ttk.Label(filter_frame, text="Action:").pack(side=LEFT, padx=(0, 5))
+        self.audit_action = ttk.Combobox(filter_frame, width=20, state="readonly", values=["All"])
+        self.audit_action.set("All")
+        self.audit_action.pack(side=LEFT, padx=(0, 10))
+        ttk.Label(filter_frame, text="Admin:").pack(side=LEFT, padx=(0, 5))
+        self.audit_admin = ttk.Entry(filter_frame, width=15)
+        self.audit_admin.pack(side=LEFT, padx=(0, 10))
+        ttk.Label(filter_frame, text="Target:").pack(side=LEFT, padx=(0, 5))
+        self.audit_target = ttk.Entry(filter_frame, width=15)
+        self.audit_target.pack(side=LEFT, padx=(0, 10))
+        ttk.Button(filter_frame, text="Apply", command=self._update_audit_tab, bootstyle="info").pack(side=LEFT, padx=5)
+        ttk.Button(filter_frame, text="Export CSV", command=self._export_audit_log, bootstyle="secondary-outline").pack(side=RIGHT)
         cols = ("Timestamp", "Admin", "Action", "Target", "Details")
-        self.audit_tree = ttk.Treeview(self.audit_tab, columns=cols, show='headings', bootstyle="info")
-        for col in cols:
-            self.audit_tree.column(col, width=120)
-            self.audit_tree.heading(col, text=col)
-        self.audit_tree.pack(expand=True, fill="both")
+        self.audit_list = PagedTreeview(self.audit_tab, cols, self._fetch_audit_page, bootstyle="info")
+        self.audit_list.pack(expand=True, fill="both")
+        self.audit_tree = self.audit_list.tree
+        for col in cols: self.audit_tree.column(col, width=120)
     def _update_manage_tab(self):
-        for i in self.user_tree.get_children(): self.user_tree.delete(i)
-        users = self.controller.bank_system.admin_get_all_users_report()
-        for u in users:
-            if u.role != 'admin':
-                status = "Locked" if u.is_locked else "Active"
-                self.user_tree.insert("", "end", values=(u.account_number, u.name, f"{u.balance:.2f}", status))
+        self.user_list.reload()
+    def _fetch_users_page(self, cursor, limit):
+        users, next_cursor = self.controller.bank_system.admin_get_users_page(cursor, limit)
+        return [(acc_num, (acc_num, name, f"{balance:.2f}", "Locked" if locked else "Active"))
+                for acc_num, name, balance, locked in users], next_cursor
+    def mark_unlocked(self, acc_num):
+        self.user_list.set_value(acc_num, "Status", "Active")
+        if self.notebook.is_built(self.audit_tab): self.audit_list.refresh_head()
+    def mark_deleted(self, acc_num):
+        self.user_list.remove(acc_num)
+        if self.notebook.is_built(self.audit_tab): self.audit_list.refresh_head()
     def _update_financials_tab(self):
         rate = self.controller.bank_system.get_interest_rate()
         self.rate_label.config(text=f"{rate}%")
+    def _audit_filters(self):
+        action = self.audit_action.get()
+        return {"action": None if action == "All" else action, "admin_user": self.audit_admin.get().strip() or None,
+                "target_user": self.audit_target.get().strip() or None}
+    def _fetch_audit_page(self, cursor, limit):
+        return self.controller.bank_system.admin_get_audit_page(cursor, limit, **self._audit_filters())
     def _update_audit_tab(self):
-        for i in self.audit_tree.get_children(): self.audit_tree.delete(i)
-        logs = self.controller.bank_system.get_audit_log()
-        for log in logs:
-            self.audit_tree.insert("", "end", values=log)
+        self.audit_action.config(values=["All"] + self.controller.bank_system.get_audit_actions())
+        self.audit_list.reload()
+    def _export_audit_log(self):
+        path = filedialog.asksaveasfilename(parent=self, defaultextension=".csv", initialfile="audit_log.csv",
+                                            filetypes=[("CSV files", "*.csv")])
+        if path: self.controller.handle_admin_export_audit_log(path, self._audit_filters())
     def _get_selected_account(self):
         selected_item = self.user_tree.focus()
         if not selected_item:
@@ -319,10 +542,9 @@ class AdminDashboardScreen(ttk.Frame):
     def _update_rate_popup(self):
         new_rate = simpledialog.askfloat("Update Rate", "Enter new annual interest rate (%):", parent=self)
         if new_rate is not None and new_rate > 0:
-            self.controller.bank_system.set_interest_rate(new_rate)
-            self._update_financials_tab()
+            self.controller.handle_admin_set_interest_rate(new_rate)
 
 if __name__ == "__main__":
-    bank_system = BankSystem()
-    app = BankApp(bank_system)
+    metrics.configure_from_env()
+    app = BankApp()
     app.mainloop()
\ No newline at end of file
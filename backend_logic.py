@@ -1,115 +1,419 @@
 import database_manager as db
-from models import Account, is_strong_password, hash_password
+import ingest
+import metrics
+import reporting
+from models import Account, TransactionHistory, MAX_AMOUNT_PAISE, is_strong_password, hash_password, password_cost, to_paise, from_paise
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
 from datetime import datetime
+import csv
+import hashlib
+import hmac
 import math
+import os
+import secrets
+import threading
+import time
+import weakref
+
+class Session:
+    def __init__(self, account):
+        self.token = secrets.token_urlsafe(32)
+        self.account = account
+        self.created_at = datetime.now()
+        self.last_used = time.monotonic()
+
+class TokenBucket:
+    """Thread-safe token bucket: ``capacity`` burst, refilled at ``rate`` tokens per second."""
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    def try_acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1: return False
+            self.tokens -= 1
+            return True
+
+class LoginCache:
+    """Bounded LRU of recent successful password checks, so repeat logins skip bcrypt.
+
+    Entries are HMACs under a per-process random key over the account, its current
+    hash and the password, so nothing reusable is kept and a password change
+    invalidates them. Entries expire after ``ttl`` seconds.
+    """
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.key = secrets.token_bytes(32)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+    def _digest(self, account, password):
+        message = "\0".join((account.account_number, account.password_hash, password)).encode()
+        return hmac.new(self.key, message, hashlib.sha256).digest()
+    def check(self, account, password):
+        digest = self._digest(account, password)
+        with self.lock:
+            entry = self.entries.get(account.account_number)
+            if entry is None: return False
+            if entry[1] < time.monotonic():
+                del self.entries[account.account_number]
+                return False
+            self.entries.move_to_end(account.account_number)
+            return hmac.compare_digest(entry[0], digest)
+    def remember(self, account, password):
+        digest = self._digest(account, password)
+        with self.lock:
+            self.entries[account.account_number] = (digest, time.monotonic() + self.ttl)
+            self.entries.move_to_end(account.account_number)
+            while len(self.entries) > self.max_entries: self.entries.popitem(last=False)
+    def forget(self, account_number):
+        with self.lock: self.entries.pop(account_number, None)
+
+class AccountRepository:
+    """Bounded LRU of ``Account`` objects, loaded from the database on demand.
+
+    ``load(account_number)`` builds an account (or returns None) and runs under
+    ``lock_for(account_number)``, the same lock writers hold, so a load never sees
+    a half-applied change. Writers update the cached object and the database
+    together; ``discard`` drops an account that was deleted. Pinned accounts
+    (signed-in users) are never evicted, so each has a single live object.
+    """
+    def __init__(self, load, lock_for, max_entries=10000):
+        self.load = load
+        self.lock_for = lock_for
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.pins = {}
+        self.hits = self.misses = self.evictions = 0
+        self.lock = threading.Lock()
+    def get(self, account_number):
+        with self.lock:
+            account = self.entries.get(account_number)
+            if account is not None:
+                self.entries.move_to_end(account_number)
+                self.hits += 1
+        if account is not None:
+            metrics.count("account_cache_hits")
+            return account
+        with self.lock_for(account_number):
+            with self.lock: account = self.entries.get(account_number)
+            if account is None:
+                account = self.load(account_number)
+                if account is None: return None
+                self.add(account)
+                with self.lock: self.misses += 1
+                metrics.count("account_cache_misses")
+            return account
+    def add(self, account):
+        with self.lock:
+            self.entries[account.account_number] = account
+            self.entries.move_to_end(account.account_number)
+            self._evict()
+    def _evict(self):
+        # Oldest first, skipping pinned accounts; called with self.lock held.
+        excess = len(self.entries) - self.max_entries
+        if excess <= 0: return
+        victims = []
+        for account_number in self.entries:
+            if account_number not in self.pins: victims.append(account_number)
+            if len(victims) == excess: break
+        for account_number in victims: del self.entries[account_number]
+        self.evictions += len(victims)
+    def discard(self, account_number):
+        with self.lock:
+            self.entries.pop(account_number, None)
+            self.pins.pop(account_number, None)
+    def pin(self, account):
+        with self.lock:
+            self.pins[account.account_number] = self.pins.get(account.account_number, 0) + 1
+            self.entries.setdefault(account.account_number, account)
+    def unpin(self, account):
+        with self.lock:
+            remaining = self.pins.get(account.account_number, 0) - 1
+            if remaining > 0: self.pins[account.account_number] = remaining
+            else:
+                self.pins.pop(account.account_number, None)
+                self._evict()
+    def cached(self):
+        with self.lock: return list(self.entries.values())
+    def __len__(self):
+        return len(self.entries)
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self.entries), "max_entries": self.max_entries, "pinned": len(self.pins),
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "hit_rate": self.hits / lookups if lookups else None}
 
 class BankSystem:
-    def __init__(self):
-        self.accounts = {}
+    """Bank operations on behalf of a user.
+
+    The desktop app acts through ``current_user``; concurrent callers open a
+    ``Session`` and pass its account as ``user``. Every read-modify-write of an
+    account holds that account's lock, and transfers take both locks in account
+    number order, so disjoint accounts proceed in parallel without deadlock.
+    Accounts are loaded on first use into ``accounts``, a bounded LRU.
+    """
+    LOGIN_BURST = 20
+    LOGIN_RATE_PER_SECOND = 10
+    ACCOUNT_CACHE_SIZE = 10000
+    SESSION_IDLE_SECONDS = 30 * 60
+    MAX_SESSIONS = 10000
+    TRANSFER_RETRY_SECONDS = 30
+    def __init__(self, account_cache_size=None):
         self.current_user = None
+        # Least recently used first. A session expires after SESSION_IDLE_SECONDS without a
+        # request, and the oldest is dropped when MAX_SESSIONS are open; either unpins its account.
+        self.sessions = OrderedDict()
+        self._sessions_lock = threading.Lock()
+        # Locks live only while someone holds them, so they do not accumulate per account.
+        self._account_locks = weakref.WeakValueDictionary()
+        self._locks_guard = threading.Lock()
+        self.accounts = AccountRepository(self._load_account, self._lock_for, account_cache_size or self.ACCOUNT_CACHE_SIZE)
+        # Caps bcrypt checks per process so a login flood cannot starve other work.
+        self.login_throttle = TokenBucket(self.LOGIN_BURST, self.LOGIN_RATE_PER_SECOND)
+        self.login_cache = LoginCache()
+        self._next_transfer_retry = time.monotonic() + self.TRANSFER_RETRY_SECONDS
+        self._transfer_retry_lock = threading.Lock()
         db.init_database()
-        self._load_accounts()
+        self.bcrypt_rounds = db.get_bcrypt_rounds()
         self._ensure_admin_exists()
-    def _load_accounts(self):
-        self.accounts.clear()
-        accounts_data = db.load_all_accounts()
-        for acc_num, data in accounts_data.items():
-            acc_num, name, balance, pwd_hash, role, f_attempts, locked = data
-            account = Account(name, acc_num, balance, pwd_hash, role, f_attempts, locked)
-            account.transactions = db.load_transactions_for_account(acc_num)
-            self.accounts[acc_num] = account
+    @metrics.timed
+    def _load_account(self, acc_number):
+        row = db.load_account(acc_number)
+        if row is None: return None
+        account = Account.from_row(row)
+        self._attach_history(account)
+        return account
+    def _attach_history(self, account):
+        account.transactions = TransactionHistory(account.account_number, db.load_transaction_page, fetch_balance=db.get_balance_at)
+    def _lock_for(self, acc_number):
+        with self._locks_guard:
+            lock = self._account_locks.get(acc_number)
+            if lock is None: lock = self._account_locks[acc_number] = threading.RLock()
+            return lock
+    @contextmanager
+    def _locked(self, *acc_numbers):
+        with ExitStack() as stack:
+            for acc_number in sorted(set(acc_numbers)):
+                stack.enter_context(self._lock_for(acc_number))
+            yield
+    def _refresh_balances(self):
+        # Only cached accounts hold a balance in memory; the rest load fresh when next used.
+        # The bulk read only finds the stale ones; each is re-read under its lock so a posting
+        # that commits in between is not overwritten with the older balance.
+        cached = {account.account_number: account for account in self.accounts.cached()}
+        for acc_num, balance in db.load_balances(cached).items():
+            account = cached[acc_num]
+            if account.balance_paise == balance: continue
+            with self._locked(acc_num):
+                balance = db.load_balances([acc_num]).get(acc_num)
+                if balance is not None and account.balance_paise != balance:
+                    account.balance_paise = balance
+                    account.transactions.invalidate()
+    def _retry_transfers(self):
+        # Cross-shard credits that failed to deliver are retried by the next transfer, by one
+        # thread at a time and at most every TRANSFER_RETRY_SECONDS, rather than at restart.
+        if not db.SHARDS or time.monotonic() < self._next_transfer_retry: return
+        if not self._transfer_retry_lock.acquire(blocking=False): return
+        try:
+            self._next_transfer_retry = time.monotonic() + self.TRANSFER_RETRY_SECONDS
+            if db.recover_transfers(): self._refresh_balances()
+        finally: self._transfer_retry_lock.release()
     def _ensure_admin_exists(self):
-        if "admin" not in self.accounts:
+        if self.accounts.get("admin") is None:
             print("No admin account found. Creating a default admin...")
             default_pass = "Admin@1234"
-            password_hash = hash_password(default_pass)
+            password_hash = hash_password(default_pass, self.bcrypt_rounds)
             admin_acc = Account("Administrator", "admin", 0, password_hash, role='admin')
             admin_acc.transactions.append((datetime.now(), "Initial Deposit", 0, 0))
             if db.create_new_account(admin_acc):
-                self.accounts["admin"] = admin_acc
+                self._attach_history(admin_acc)
+                self.accounts.add(admin_acc)
                 print(f"Default admin created. User: admin, Pass: {default_pass}")
-    def login(self, acc_number, password):
+    @metrics.timed
+    def _check_password(self, account, password):
+        # Returns True/False, or None when the bcrypt budget is exhausted.
+        if self.login_cache.check(account, password):
+            metrics.count("login_cache_hits")
+            return True
+        if not self.login_throttle.try_acquire():
+            metrics.count("login_throttled")
+            return None
+        if not account.verify_password(password):
+            metrics.count("password_check_failures")
+            return False
+        if password_cost(account.password_hash) != self.bcrypt_rounds:
+            metrics.count("password_rehashes")
+            password_hash = hash_password(password, self.bcrypt_rounds)
+            if db.update_password(account.account_number, password_hash): account.password_hash = password_hash
+        self.login_cache.remember(account, password)
+        return True
+    def _authenticate(self, acc_number, password):
         alert_message = None
-        if acc_number not in self.accounts: return "Account not found.", None, None
-        account = self.accounts[acc_number]
-        if account.is_locked: return "This account is locked.", None, None
-        if account.verify_password(password):
-            account.reset_failed_attempts()
-            db.update_account_state(account)
+        with self._locked(acc_number):
+            account = self.accounts.get(acc_number)
+            if account is None: return "Account not found.", None, None
+            if account.is_locked: return "This account is locked.", None, None
+            verified = self._check_password(account, password)
+            if verified is None: return "Too many login attempts right now. Please try again shortly.", None, None
+            if verified:
+                if account.failed_attempts:
+                    account.reset_failed_attempts()
+                    db.update_account_state(account)
+                if account.balance < 1000:
+                    alert_message = f"Warning: Low balance: INR {account.balance:.2f}"
+                self.accounts.pin(account)
+                return "Login successful.", account, alert_message
+            else:
+                account.increment_failed_attempts()
+                db.update_account_state(account)
+                remaining = Account.MAX_FAILED_ATTEMPTS - account.failed_attempts
+                return f"Incorrect password. {remaining} attempts remaining.", None, None
+    @metrics.timed
+    def login(self, acc_number, password):
+        status, account, alert_message = self._authenticate(acc_number, password)
+        if account:
+            if self.current_user: self.accounts.unpin(self.current_user)
             self.current_user = account
-            if self.current_user.balance < 1000:
-                alert_message = f"Warning: Low balance: INR {self.current_user.balance:.2f}"
-            return "Login successful.", account, alert_message
-        else:
-            account.increment_failed_attempts()
-            db.update_account_state(account)
-            remaining = Account.MAX_FAILED_ATTEMPTS - account.failed_attempts
-            return f"Incorrect password. {remaining} attempts remaining.", None, None
+        return status, account, alert_message
     def logout(self):
+        if self.current_user: self.accounts.unpin(self.current_user)
         self.current_user = None
+    @metrics.timed
+    def open_session(self, acc_number, password):
+        status, account, alert_message = self._authenticate(acc_number, password)
+        if not account: return status, None, None
+        session = Session(account)
+        with self._sessions_lock:
+            self._expire_sessions()
+            while len(self.sessions) >= self.MAX_SESSIONS: self._drop_session(next(iter(self.sessions)))
+            self.sessions[session.token] = session
+        return status, session, alert_message
+    def get_session(self, token):
+        with self._sessions_lock:
+            self._expire_sessions()
+            session = self.sessions.get(token)
+            if session is None: return None
+            session.last_used = time.monotonic()
+            self.sessions.move_to_end(token)
+            return session
+    def close_session(self, token):
+        with self._sessions_lock: return self._drop_session(token)
+    def _drop_session(self, token):
+        session = self.sessions.pop(token, None)
+        if session is None: return False
+        self.accounts.unpin(session.account)
+        return True
+    def _expire_sessions(self):
+        # Sessions are ordered by last use, so the expired ones are at the front.
+        cutoff = time.monotonic() - self.SESSION_IDLE_SECONDS
+        while self.sessions:
+            token, session = next(iter(self.sessions.items()))
+            if session.last_used > cutoff: return
+            self._drop_session(token)
+            metrics.count("sessions_expired")
+    @metrics.timed
     def create_account(self, name, acc_number, password, balance):
         if not all(c.isalpha() or c.isspace() or c == '-' for c in name if c): return "Name is invalid."
         if not acc_number.isalnum(): return "Account number must be alphanumeric."
-        if acc_number in self.accounts: return "An account with this number already exists."
+        if self.accounts.get(acc_number) is not None: return "An account with this number already exists."
         is_strong, message = is_strong_password(password)
         if not is_strong: return f"Invalid password: {message}"
         if balance < 0: return "Balance cannot be negative."
-        password_hash = hash_password(password)
+        balance = to_paise(balance)
+        if balance > MAX_AMOUNT_PAISE: return f"Opening balance cannot exceed INR {from_paise(MAX_AMOUNT_PAISE):.2f}."
+        password_hash = hash_password(password, self.bcrypt_rounds)
         account = Account(name, acc_number, balance, password_hash)
         account.transactions.append((datetime.now(), "Initial Deposit", balance, balance))
         if db.create_new_account(account):
-            self.accounts[acc_number] = account
+            self._attach_history(account)
+            self.accounts.add(account)
             return "Account created successfully! You can now log in."
         else: return "An unexpected error occurred during account creation."
-    def get_current_user_details(self):
-        if not self.current_user: return "No user logged in."
-        return self.current_user
-    def deposit(self, amount):
-        transaction = self.current_user.deposit(amount)
-        if transaction:
-            db.save_new_transaction(self.current_user.account_number, transaction)
-            db.update_account_state(self.current_user)
-            return f"Successfully deposited INR {amount:.2f}."
-        else: return "Deposit failed. Amount must be positive."
-    def withdraw(self, amount):
-        transaction = self.current_user.withdraw(amount)
-        if transaction:
-            db.save_new_transaction(self.current_user.account_number, transaction)
-            db.update_account_state(self.current_user)
-            return f"Successfully withdrew INR {amount:.2f}."
-        else: return "Withdrawal failed. Check amount and balance."
-    def transfer_funds(self, to_acc_number, amount):
-        if to_acc_number not in self.accounts: return "Recipient account not found."
-        if to_acc_number == self.current_user.account_number: return "Cannot transfer to your own account."
+    def get_current_user_details(self, user=None):
+        user = user or self.current_user
+        if not user: return "No user logged in."
+        return user
+    @metrics.timed
+    def get_period_summary(self, start, end, user=None):
+        # Opening balance before `start`, closing balance at the end of `end` and the net
+        # change, all from snapshot lookups rather than a scan of the period's rows.
+        user = user or self.current_user
+        opening = db.get_balance_at(user.account_number, datetime.combine(start, datetime.min.time())) or 0
+        closing = db.get_balance_at(user.account_number, end) or 0
+        return from_paise(opening), from_paise(closing), from_paise(closing - opening)
+    @metrics.timed
+    def deposit(self, amount, user=None):
+        user = user or self.current_user
+        amount = to_paise(amount)
+        if amount <= 0: return "Deposit failed. Amount must be positive."
+        if amount > MAX_AMOUNT_PAISE: return f"Deposit failed. Amount cannot exceed INR {from_paise(MAX_AMOUNT_PAISE):.2f}."
+        with self._locked(user.account_number):
+            transaction = db.execute_posting(user.account_number, "Deposit", amount, amount)
+            if not transaction: return "Deposit failed due to a database error."
+            user.apply_transaction(transaction)
+        return f"Successfully deposited INR {from_paise(amount):.2f}."
+    @metrics.timed
+    def withdraw(self, amount, user=None):
+        user = user or self.current_user
+        amount = to_paise(amount)
+        if amount > MAX_AMOUNT_PAISE: return f"Withdrawal failed. Amount cannot exceed INR {from_paise(MAX_AMOUNT_PAISE):.2f}."
+        with self._locked(user.account_number):
+            if amount <= 0 or amount > user.balance_paise: return "Withdrawal failed. Check amount and balance."
+            transaction = db.execute_posting(user.account_number, "Withdrawal", amount, -amount)
+            if not transaction: return "Withdrawal failed. Check amount and balance."
+            user.apply_transaction(transaction)
+        return f"Successfully withdrew INR {from_paise(amount):.2f}."
+    @metrics.timed
+    def transfer_funds(self, to_acc_number, amount, user=None):
+        from_account = user or self.current_user
+        amount = to_paise(amount)
+        if to_acc_number == from_account.account_number: return "Cannot transfer to your own account."
         if amount <= 0: return "Transfer amount must be positive."
-        if amount > self.current_user.balance: return "Insufficient balance."
-        from_account = self.current_user
-        to_account = self.accounts[to_acc_number]
-        from_account.balance -= amount
-        to_account.balance += amount
-        from_account.transactions.append((datetime.now(), "Transfer Out", amount, from_account.balance))
-        to_account.transactions.append((datetime.now(), "Transfer In", amount, to_account.balance))
-        if db.execute_transfer(from_account, to_account):
-            return f"Successfully transferred INR {amount:.2f} to {to_account.name}."
-        else:
-            from_account.balance += amount
-            to_account.balance -= amount
-            from_account.transactions.pop()
-            to_account.transactions.pop()
-            return "Transfer failed due to a database error."
-    def update_user_name(self, new_name):
+        if amount > MAX_AMOUNT_PAISE: return f"Transfer amount cannot exceed INR {from_paise(MAX_AMOUNT_PAISE):.2f}."
+        self._retry_transfers()
+        with self._locked(from_account.account_number, to_acc_number):
+            to_account = self.accounts.get(to_acc_number)
+            if to_account is None: return "Recipient account not found."
+            if amount > from_account.balance_paise: return "Insufficient balance."
+            transactions = db.execute_transfer(from_account.account_number, to_acc_number, amount)
+            if not transactions: return "Transfer failed due to a database error."
+            from_account.apply_transaction(transactions[0])
+            if transactions[1] is None:
+                # Debited on the sender's shard; a later transfer retries the credit (_retry_transfers).
+                to_account.transactions.invalidate()
+                return f"Transferred INR {from_paise(amount):.2f}; the credit to {to_account.name} is pending."
+            to_account.apply_transaction(transactions[1])
+        return f"Successfully transferred INR {from_paise(amount):.2f} to {to_account.name}."
+    @metrics.timed
+    def update_user_name(self, new_name, user=None):
+        user = user or self.current_user
         if not all(c.isalpha() or c.isspace() or c == '-' for c in new_name if c): return "Name is invalid."
-        self.current_user.name = new_name
-        db.update_account_state(self.current_user)
+        with self._locked(user.account_number):
+            user.name = new_name
+            db.update_account_state(user)
         return "Name updated successfully."
-    def update_user_password(self, old_password, new_password):
-        if not self.current_user.verify_password(old_password): return "Current password incorrect."
+    @metrics.timed
+    def update_user_password(self, old_password, new_password, user=None):
+        user = user or self.current_user
+        verified = self._check_password(user, old_password)
+        if verified is None: return "Too many password checks right now. Please try again shortly."
+        if not verified: return "Current password incorrect."
         is_strong, message = is_strong_password(new_password)
         if not is_strong: return f"Failed to update: {message}"
-        self.current_user.password_hash = hash_password(new_password)
-        if db.update_password(self.current_user.account_number, self.current_user.password_hash):
-            return "Password updated successfully."
-        else: return "Failed to update password in database."
+        password_hash = hash_password(new_password, self.bcrypt_rounds)
+        with self._locked(user.account_number):
+            if not db.update_password(user.account_number, password_hash): return "Failed to update password in database."
+            user.password_hash = password_hash
+            self.login_cache.forget(user.account_number)
+        return "Password updated successfully."
     def calculate_loan_emi(self, principal, annual_rate, years):
         if principal <= 0 or annual_rate <= 0 or years <= 0:
             return "Principal, rate, and years must be positive values."
@@ -117,45 +421,109 @@ class BankSystem:
         months = years * 12
         emi = principal * monthly_rate * (pow(1 + monthly_rate, months)) / (pow(1 + monthly_rate, months) - 1)
         return f"Estimated EMI: INR {emi:.2f} per month."
-    def admin_delete_account(self, acc_to_delete):
+    @metrics.timed
+    def admin_delete_account(self, acc_to_delete, user=None):
+        admin = user or self.current_user
         acc_to_delete = str(acc_to_delete)
-        if acc_to_delete == self.current_user.account_number: return "Admin cannot delete their own account."
-        if acc_to_delete not in self.accounts: return "Account not found."
-        if db.delete_account_and_transactions(acc_to_delete):
-            db.log_admin_action(self.current_user.account_number, "DELETE_ACCOUNT", acc_to_delete)
-            del self.accounts[acc_to_delete]
-            return f"Account {acc_to_delete} deleted successfully."
-        else: return "Failed to delete account from database."
-    def admin_unlock_account(self, acc_to_unlock):
+        if acc_to_delete == admin.account_number: return "Admin cannot delete their own account."
+        with self._locked(acc_to_delete):
+            if self.accounts.get(acc_to_delete) is None: return "Account not found."
+            if not db.delete_account_and_transactions(acc_to_delete): return "Failed to delete account from database."
+            db.log_admin_action(admin.account_number, "DELETE_ACCOUNT", acc_to_delete)
+            self.accounts.discard(acc_to_delete)
+            with self._sessions_lock:
+                for token, session in list(self.sessions.items()):
+                    if session.account.account_number == acc_to_delete: self.sessions.pop(token, None)
+        self.login_cache.forget(acc_to_delete)
+        return f"Account {acc_to_delete} deleted successfully."
+    @metrics.timed
+    def admin_unlock_account(self, acc_to_unlock, user=None):
+        admin = user or self.current_user
         acc_to_unlock = str(acc_to_unlock)
-        if acc_to_unlock not in self.accounts: return "Account not found."
-        target_account = self.accounts[acc_to_unlock]
-        if not target_account.is_locked:
-            return f"Account {acc_to_unlock} is already active."
-        target_account.reset_failed_attempts()
-        db.update_account_state(target_account)
-        db.log_admin_action(self.current_user.account_number, "UNLOCK_ACCOUNT", acc_to_unlock)
+        with self._locked(acc_to_unlock):
+            target_account = self.accounts.get(acc_to_unlock)
+            if target_account is None: return "Account not found."
+            if not target_account.is_locked:
+                return f"Account {acc_to_unlock} is already active."
+            target_account.reset_failed_attempts()
+            db.update_account_state(target_account)
+        db.log_admin_action(admin.account_number, "UNLOCK_ACCOUNT", acc_to_unlock)
         return f"Account {acc_to_unlock} has been unlocked."
     def admin_get_all_users_report(self):
-        return [acc for acc in self.accounts.values()]
-    def admin_apply_interest(self):
+        # Built straight from the rows so a full listing does not flush the account cache.
+        return [Account.from_row(row) for row in db.load_all_accounts().values()]
+    def get_account_cache_stats(self):
+        return self.accounts.stats()
+    @metrics.timed
+    def admin_get_users_page(self, after=None, limit=100):
+        rows = db.load_account_page(after, limit)
+        next_after = rows[-1][0] if len(rows) == limit else None
+        return [(acc_num, name, from_paise(balance), bool(locked)) for acc_num, name, balance, locked in rows], next_after
+    @metrics.timed
+    def admin_get_balances_on(self, day):
+        # Closing balance of every user account on `day`, read from the daily snapshots.
+        return [(acc_num, from_paise(balance)) for acc_num, balance in db.load_balances_on(day)]
+    @metrics.timed
+    def admin_get_analytics(self, days=30):
+        return reporting.dashboard(days)
+    @metrics.timed
+    def set_bcrypt_rounds(self, rounds, user=None):
+        # Existing hashes move to the new cost as their owners next log in.
+        admin = user or self.current_user
+        if not 4 <= rounds <= 16: return "bcrypt cost must be between 4 and 16."
+        db.set_bcrypt_rounds(rounds)
+        self.bcrypt_rounds = rounds
+        db.log_admin_action(admin.account_number, "SET_BCRYPT_ROUNDS", "SYSTEM", f"New cost: {rounds}")
+        return f"Password hashing cost set to {rounds}."
+    @metrics.timed
+    def admin_apply_interest(self, user=None):
+        admin = user or self.current_user
         rate = db.get_interest_rate()
-        annual_rate = rate / 100
-        for acc in self.accounts.values():
-            if acc.role == 'user' and acc.balance > 0:
-                interest_amount = acc.balance * annual_rate
-                acc.deposit(interest_amount)
-                t_date, _, t_amt, t_bal = acc.transactions.pop()
-                interest_transaction = (t_date, "Credit Interest", t_amt, t_bal)
-                acc.transactions.append(interest_transaction)
-                db.save_new_transaction(acc.account_number, interest_transaction)
-                db.update_account_state(acc)
-        db.log_admin_action(self.current_user.account_number, "APPLY_INTEREST", "ALL_USERS", f"Rate: {rate}%")
-        return f"Applied {rate}% annual interest to all eligible accounts."
+        credited = db.apply_interest_to_all(rate / 100, admin.account_number, f"Rate: {rate}%")
+        if credited is None: return "Failed to apply interest due to a database error."
+        self._refresh_balances()
+        return f"Applied {rate}% annual interest to {credited} eligible accounts."
+    @metrics.timed
+    def admin_ingest_payments(self, path, rejects_path=None, user=None):
+        admin = user or self.current_user
+        posted, rejected = ingest.ingest_file(path, rejects_path)
+        db.log_admin_action(admin.account_number, "INGEST_PAYMENTS", "BATCH", f"{os.path.basename(path)}: {posted} posted, {rejected} rejected")
+        self._refresh_balances()
+        return f"Posted {posted} payments from {os.path.basename(path)}; {rejected} rejected."
+    @metrics.timed
+    def admin_backup_database(self, compress=True, user=None):
+        admin = user or self.current_user
+        backup_file = db.backup_database(compress=compress)
+        if not backup_file: return "Backup failed; see the log for details."
+        db.log_admin_action(admin.account_number, "BACKUP_DATABASE", "SYSTEM", os.path.basename(backup_file))
+        return f"Backup created: {os.path.basename(backup_file)}"
+    @metrics.timed
+    def admin_get_audit_page(self, before=None, limit=100, **filters):
+        # Filters: admin_user, action, target_user (exact matches) and start/end datetimes.
+        rows = db.load_audit_page(before, limit, **filters)
+        next_before = (rows[-1][1], rows[-1][0]) if len(rows) == limit else None
+        return [(row[0], row[1:]) for row in rows], next_before
+    def get_audit_actions(self):
+        return db.load_audit_actions()
+    @metrics.timed
+    def admin_export_audit_log(self, path, user=None, **filters):
+        admin = user or self.current_user
+        exported = 0
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["Timestamp", "Admin", "Action", "Target", "Details"])
+            for row in db.iter_audit_log(**filters):
+                writer.writerow(row[1:])
+                exported += 1
+        db.log_admin_action(admin.account_number, "EXPORT_AUDIT_LOG", "SYSTEM", f"{os.path.basename(path)}: {exported} entries")
+        return f"Exported {exported} audit entries to {os.path.basename(path)}."
+    @metrics.timed
     def get_audit_log(self):
         return db.get_audit_log()
     def get_interest_rate(self):
         return db.get_interest_rate()
-    def set_interest_rate(self, rate):
+    @metrics.timed
+    def set_interest_rate(self, rate, user=None):
+        admin = user or self.current_user
         db.set_interest_rate(rate)
-        db.log_admin_action(self.current_user.account_number, "SET_INTEREST_RATE", "SYSTEM", f"New rate: {rate}%")
\ No newline at end of file
+        db.log_admin_action(admin.account_number, "SET_INTEREST_RATE", "SYSTEM", f"New rate: {rate}%")
\ No newline at end of file
@@ -0,0 +1,41 @@
+"""Scheduled backups of the bank database.
+
+Full backups use SQLite's online backup API and can run while the app and API
+are serving traffic. Incremental exports write only the ledger and audit rows
+added since the previous export.
+
+    python backup.py --dir backups --compress --keep 14          # nightly full backup
+    python backup.py --dir backups --incremental --compress      # hourly incremental
+    python backup.py --reconcile-transfers                       # once, after restoring shards
+"""
+import argparse
+import os
+
+import database_manager as db
+
+def main():
+    parser = argparse.ArgumentParser(description="Back up the bank database without stopping it.")
+    parser.add_argument("--dir", help="Backup directory (defaults to the application directory).")
+    parser.add_argument("--compress", action="store_true", help="gzip the backup.")
+    parser.add_argument("--keep", type=int, help="Full backups to keep; older ones are deleted.")
+    parser.add_argument("--incremental", action="store_true", help="Export rows added since the last export instead.")
+    parser.add_argument("--reconcile-transfers", action="store_true",
+                        help="After restoring shard files, settle cross-shard transfers caught between their backups.")
+    parser.add_argument("--pages", type=int, default=1024, help="Pages copied per backup step.")
+    parser.add_argument("--db", default=db.DB_FILE, help="Database file to back up.")
+    args = parser.parse_args()
+    db.DB_FILE = args.db
+    if args.reconcile_transfers:
+        db.init_database()
+        print(f"Reconciled {db.recover_transfers(reconcile=True)} cross-shard transfers.")
+        raise SystemExit(0)
+    if args.incremental:
+        db.init_database()
+        path, _ = db.export_incremental(args.dir, args.compress)
+    else:
+        if os.path.exists(db.DB_FILE): db.configure_shards()
+        path = db.backup_database(args.dir, args.compress, args.keep, args.pages)
+    raise SystemExit(0 if path else 1)
+
+if __name__ == "__main__":
+    main()
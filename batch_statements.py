@@ -0,0 +1,88 @@
+"""Headless month-end statement run.
+
+Renders PDF and/or CSV statements for every account (or a chosen subset) across
+a pool of worker processes. Each worker opens its own read-only connection and
+streams ledger rows, so the run never holds a full history in memory. Finished
+accounts are appended to a manifest in the output directory; rerunning the same
+command skips them, which makes an interrupted run resumable.
+
+    python batch_statements.py --month 2026-09 --output statements/2026-09
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import database_manager as db
+from models import Account, TransactionHistory
+
+PROGRESS_EVERY = 100
+
+def _init_worker(db_file, shards):
+    db.DB_FILE = db_file
+    db.SHARDS = shards
+    db.READ_ONLY = True
+def _render_account(job):
+    account_number, formats, start, end, directory = job
+    row = db.load_account(account_number)
+    if row is None: return account_number, []
+    account = Account.from_row(row)
+    account.transactions = TransactionHistory(account_number, db.load_transaction_page, fetch_balance=db.get_balance_at)
+    files = []
+    if "pdf" in formats: files.append(account.generate_statement(start, end, directory))
+    if "csv" in formats: files.append(account.export_to_csv(start, end, directory))
+    return account_number, files
+
+def month_period(month):
+    first = date.fromisoformat(f"{month}-01")
+    next_month = (first + timedelta(days=32)).replace(day=1)
+    return first, next_month - timedelta(days=1)
+def read_manifest(manifest_path):
+    if not os.path.exists(manifest_path): return set()
+    with open(manifest_path) as manifest:
+        return {json.loads(line)["account"] for line in manifest if line.strip()}
+def run_batch(output_dir, start=None, end=None, formats=("pdf", "csv"), accounts=None, workers=None, chunksize=8):
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, "manifest.jsonl")
+    done = read_manifest(manifest_path)
+    targets = accounts if accounts else db.load_account_numbers(role='user')
+    pending = [acc for acc in targets if acc not in done]
+    print(f"{len(pending)} statements to generate ({len(targets) - len(pending)} already done).")
+    jobs = ((acc, tuple(formats), start, end, output_dir) for acc in pending)
+    context = multiprocessing.get_context("spawn")
+    started, completed = time.perf_counter(), 0
+    with open(manifest_path, "a") as manifest, ProcessPoolExecutor(
+            max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(db.DB_FILE, db.SHARDS)) as pool:
+        for account_number, files in pool.map(_render_account, jobs, chunksize=chunksize):
+            manifest.write(json.dumps({"account": account_number, "files": files}) + "\n")
+            manifest.flush()
+            completed += 1
+            if completed % PROGRESS_EVERY == 0 or completed == len(pending):
+                elapsed = time.perf_counter() - started
+                print(f"{completed}/{len(pending)} statements, {completed / elapsed:.1f} accounts/s")
+    return completed
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate statements for many accounts in parallel.")
+    parser.add_argument("--output", required=True, help="Directory for statements and the resume manifest.")
+    parser.add_argument("--month", help="Statement month as YYYY-MM (overrides --start/--end).")
+    parser.add_argument("--start", type=date.fromisoformat, help="First day to include (YYYY-MM-DD).")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last day to include (YYYY-MM-DD).")
+    parser.add_argument("--format", choices=["pdf", "csv"], action="append", help="Repeat for both; defaults to both.")
+    parser.add_argument("--accounts", nargs="+", help="Only these account numbers.")
+    parser.add_argument("--workers", type=int, help="Worker processes (defaults to the CPU count).")
+    parser.add_argument("--db", default=db.DB_FILE, help="Database file to read.")
+    args = parser.parse_args()
+    db.DB_FILE = os.path.abspath(args.db)
+    db.configure_shards()
+    start, end = month_period(args.month) if args.month else (args.start, args.end)
+    started = time.perf_counter()
+    completed = run_batch(args.output, start, end, args.format or ("pdf", "csv"), args.accounts, args.workers)
+    elapsed = time.perf_counter() - started
+    print(f"Generated {completed} statements in {elapsed:.1f}s.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Benchmark harness for the banking backend.
+
+Builds a synthetic database through the normal schema (accounts x transactions
+per account, spread over the past year), then times the main BankSystem paths
+and writes the results as JSON so runs can be compared across commits.
+
+    python benchmark.py --accounts 5000 --transactions 50 --output bench.json
+    python benchmark.py --db big.db --reuse      # time an existing synthetic database
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import database_manager as db
+from backend_logic import BankSystem
+from models import hash_password
+
+PASSWORD = "Bench@1234"
+AUDIT_ROWS_PER_ACCOUNT = 0.1
+
+def generate_database(path, accounts=1000, transactions=50, seed=42, rounds=None):
+    """Create a synthetic database at ``path`` with the repo's schema."""
+    db.DB_FILE = path
+    for file in db.database_files():
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(file + suffix): os.remove(file + suffix)
+    db.init_database()
+    if rounds: db.set_bcrypt_rounds(rounds)
+    rounds = db.get_bcrypt_rounds()
+    password_hash = hash_password(PASSWORD, rounds)
+    rng = random.Random(seed)
+    start = datetime.now() - timedelta(days=365)
+    step = timedelta(days=365) / max(transactions, 1)
+    for first in range(0, accounts, 1000):
+        account_rows, ledger_rows, snapshot_rows = [], [], []
+        for n in range(first, min(first + 1000, accounts)):
+            account_number = f"B{n:07d}"
+            balance = rng.randrange(1000, 5000000)
+            when = start
+            ledger_rows.append((account_number, when.isoformat(), "Initial Deposit", balance, balance))
+            closing = {when.date().isoformat(): balance}
+            for _ in range(transactions - 1):
+                when += step
+                amount = rng.randrange(100, 2000000)
+                if rng.random() < 0.6 or amount > balance:
+                    balance += amount
+                    ledger_rows.append((account_number, when.isoformat(), "Deposit", amount, balance))
+                else:
+                    balance -= amount
+                    ledger_rows.append((account_number, when.isoformat(), "Withdrawal", amount, balance))
+                closing[when.date().isoformat()] = balance
+            account_rows.append((account_number, f"Customer {n}", balance, password_hash, "user", 0, 0))
+            snapshot_rows.extend((account_number, day, bal) for day, bal in closing.items())
+        for shard in db.shard_files():
+            on_shard = lambda rows: [row for row in rows if db.shard_for(row[0]) == shard]
+            with db.using(shard), db.atomic(immediate=True) as cursor:
+                cursor.executemany("INSERT INTO accounts VALUES (?, ?, ?, ?, ?, ?, ?)", on_shard(account_rows))
+                cursor.executemany("INSERT INTO transactions (account_number, date, trans_type, amount, balance) VALUES (?, ?, ?, ?, ?)", on_shard(ledger_rows))
+                cursor.executemany("INSERT INTO daily_balances (account_number, day, balance) VALUES (?, ?, ?)", on_shard(snapshot_rows))
+    with db.atomic() as cursor:
+        cursor.executemany("INSERT INTO audit_log (timestamp, admin_user, action, target_user, details) VALUES (?, ?, ?, ?, ?)",
+                           [((start + timedelta(minutes=i)).isoformat(), "admin", "UNLOCK_ACCOUNT", f"B{i % max(accounts, 1):07d}", "")
+                            for i in range(int(accounts * AUDIT_ROWS_PER_ACCOUNT))])
+    db.close_connections()
+
+def _summary(samples):
+    samples = sorted(samples)
+    def percentile(p): return samples[min(len(samples) - 1, int(p * len(samples)))]
+    total = sum(samples)
+    return {"count": len(samples), "mean_ms": 1000 * statistics.fmean(samples), "p50_ms": 1000 * percentile(0.5),
+            "p95_ms": 1000 * percentile(0.95), "p99_ms": 1000 * percentile(0.99), "max_ms": 1000 * samples[-1],
+            "ops_per_s": len(samples) / total if total else None}
+def _time(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - started, result
+def _repeat(func, ops):
+    return _summary([_time(func, i)[0] for i in range(ops)])
+
+def run_benchmarks(path, ops=200, statements=5, seed=42):
+    db.DB_FILE = path
+    rng = random.Random(seed)
+    results = {}
+    elapsed, bank = _time(BankSystem)
+    results["startup"] = {"seconds": elapsed}
+    # The throttle protects production logins; lift it so the timings measure bcrypt itself.
+    bank.login_throttle.capacity = bank.login_throttle.tokens = float("inf")
+    users = db.load_account_numbers(role='user')
+    sample = [rng.choice(users) for _ in range(ops)]
+    def login_uncached(i):
+        bank.login_cache.forget(sample[i])
+        bank.login(sample[i], PASSWORD)
+    results["login"] = _repeat(login_uncached, min(ops, 50))
+    for acc in set(sample): bank.login(acc, PASSWORD)
+    results["login_cached"] = _repeat(lambda i: bank.login(sample[i], PASSWORD), ops)
+    accounts = [bank.accounts.get(acc) for acc in sample]
+    results["deposit"] = _repeat(lambda i: bank.deposit(rng.randint(1, 1000), user=accounts[i]), ops)
+    results["withdraw"] = _repeat(lambda i: bank.withdraw(1, user=accounts[i]), ops)
+    results["transfer"] = _repeat(lambda i: bank.transfer_funds(rng.choice(users), 1, user=accounts[i]), ops)
+    results["history_first_page"] = _repeat(lambda i: accounts[i].transactions.keyed_page(), ops)
+    admin = bank.accounts.get("admin")
+    elapsed, _ = _time(bank.admin_apply_interest, user=admin)
+    results["apply_interest"] = {"seconds": elapsed}
+    elapsed, logs = _time(bank.get_audit_log)
+    results["audit_log"] = {"seconds": elapsed, "rows": len(logs)}
+    with tempfile.TemporaryDirectory() as directory:
+        pdf = [_time(accounts[i].generate_statement, None, None, directory)[0] for i in range(min(statements, ops))]
+        csv_ = [_time(accounts[i].export_to_csv, None, None, directory)[0] for i in range(min(statements, ops))]
+    results["statement_pdf"] = _summary(pdf)
+    results["statement_csv"] = _summary(csv_)
+    results["account_cache"] = bank.get_account_cache_stats()
+    db.close_connections()
+    return results
+
+def _git_commit():
+    try: return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                               cwd=db.SCRIPT_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError): return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the banking backend on synthetic data.")
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--transactions", type=int, default=50, help="Ledger rows per account.")
+    parser.add_argument("--ops", type=int, default=200, help="Operations per latency measurement.")
+    parser.add_argument("--statements", type=int, default=5, help="Statements to render per format.")
+    parser.add_argument("--rounds", type=int, help="bcrypt cost for the synthetic passwords (defaults to the configured cost).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "bank_benchmark.db"))
+    parser.add_argument("--reuse", action="store_true", help="Benchmark an existing --db instead of regenerating it.")
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout.")
+    args = parser.parse_args()
+    report = {"commit": _git_commit(), "timestamp": datetime.now().isoformat(timespec="seconds"),
+              "python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+              "params": {"accounts": args.accounts, "transactions": args.transactions, "ops": args.ops, "seed": args.seed}}
+    if not args.reuse:
+        elapsed, _ = _time(generate_database, args.db, args.accounts, args.transactions, args.seed, args.rounds)
+        report["generate_seconds"] = elapsed
+    report["results"] = run_benchmarks(args.db, args.ops, args.statements, args.seed)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file: file.write(output + "\n")
+        print(f"Benchmark results written to {args.output}")
+    else: print(output)
+
+if __name__ == "__main__":
+    main()
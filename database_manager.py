@@ -1,28 +1,267 @@
+import functools
+import gzip
+import heapq
+import json
 import os
 import sqlite3
 import shutil
-from datetime import datetime
+import queue
+import threading
+import time as time_module
+import uuid
+import zlib
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from itertools import islice
+from pathlib import Path
+
+import metrics
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_FILE = os.path.join(SCRIPT_DIR, "accounts.db")
+STATEMENT_CACHE_SIZE = 256
+PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", "-16000"),
+    ("mmap_size", "268435456"),
+    ("temp_store", "MEMORY"),
+)
+# Set by read-only processes (e.g. statement workers): connections are opened with
+# mode=ro and leave the journal mode alone.
+READ_ONLY = False
+# Number of shard files that accounts, their ledgers and balances are spread over by
+# crc32(account_number); 0 keeps everything in DB_FILE. DB_FILE always holds the audit
+# log and system_config, which records the count so it cannot change under existing data.
+SHARDS = int(os.environ.get("BANK_SHARDS", "0"))
+_local = threading.local()
+# Bumped whenever a write transaction commits in this process; caches of derived data
+# (see reporting.py) compare it to tell whether they may be stale.
+_write_generation = 0
+
+def _shard_path(index):
+    root, extension = os.path.splitext(DB_FILE)
+    return f"{root}_shard{index}{extension}"
+def shard_files():
+    # Files holding accounts, transactions and daily_balances.
+    return [_shard_path(i) for i in range(SHARDS)] if SHARDS else [DB_FILE]
+def database_files():
+    return [DB_FILE] + shard_files() if SHARDS else [DB_FILE]
+def shard_for(account_number):
+    if not SHARDS: return DB_FILE
+    return _shard_path(zlib.crc32(account_number.encode()) % SHARDS)
+def _current_file():
+    return getattr(_local, "db_file", None) or DB_FILE
+@contextmanager
+def using(path):
+    """Send this thread's queries to ``path`` for the enclosed block.
+
+    A transaction opened inside is independent of any transaction the thread
+    already has open on another file.
+    """
+    if path == _current_file():
+        yield
+        return
+    saved = getattr(_local, "db_file", None), getattr(_local, "depth", 0), getattr(_local, "rollback_only", False)
+    _local.db_file, _local.depth = path, 0
+    try: yield
+    finally: _local.db_file, _local.depth, _local.rollback_only = saved
+def by_account(func):
+    # Runs `func` on the shard of its first argument, an account number or Account.
+    @functools.wraps(func)
+    def wrapper(account, *args, **kwargs):
+        with using(shard_for(getattr(account, "account_number", account))): return func(account, *args, **kwargs)
+    return wrapper
+def _across_shards(load, *args, **kwargs):
+    results = []
+    for path in shard_files():
+        with using(path): results.append(load(*args, **kwargs))
+    return results
+
+def get_connection():
+    # One long-lived connection per thread and database file; sqlite3 keeps the
+    # prepared statements of each connection in its statement cache.
+    connections = getattr(_local, "connections", None)
+    if connections is None: connections = _local.connections = {}
+    path = _current_file()
+    conn = connections.get(path)
+    if conn is None:
+        if READ_ONLY:
+            conn = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True, cached_statements=STATEMENT_CACHE_SIZE)
+        else:
+            conn = sqlite3.connect(path, cached_statements=STATEMENT_CACHE_SIZE)
+        for name, value in PRAGMAS:
+            if READ_ONLY and name == "journal_mode": continue
+            conn.execute(f"PRAGMA {name} = {value}")
+        connections[path] = conn
+    return conn
+def close_connections():
+    for conn in getattr(_local, "connections", {}).values():
+        conn.close()
+    _local.connections = {}
+@contextmanager
+def atomic(immediate=False):
+    """Run the enclosed statements in one transaction on the thread's connection.
+
+    Nested blocks join the outermost transaction, which commits once on exit. A
+    failure inside a nested block (even one the caller catches) rolls back the
+    whole transaction. ``immediate`` takes the write lock up front, which also
+    makes schema statements part of the transaction.
+    """
+    conn = get_connection()
+    depth = getattr(_local, "depth", 0)
+    if depth == 0:
+        _local.rollback_only = False
+        if immediate and not conn.in_transaction: conn.execute("BEGIN IMMEDIATE")
+    _local.depth = depth + 1
+    cursor = conn.cursor()
+    try:
+        yield cursor
+    except BaseException:
+        _local.rollback_only = True
+        raise
+    finally:
+        _local.depth = depth
+        cursor.close()
+        if depth == 0:
+            if _local.rollback_only: conn.rollback()
+            else:
+                conn.commit()
+                _bump_write_generation()
+class GroupCommitWriter:
+    """Single writer thread that commits many callers' writes together.
+
+    ``submit(operation)`` queues ``operation(cursor)`` and returns a Future. The
+    writer takes up to ``max_batch`` queued operations, waiting at most
+    ``max_latency`` seconds for more after the first, and runs each one in its own
+    SAVEPOINT inside one transaction. A failing operation is rolled back alone and
+    its Future gets the exception. Futures resolve only after the group's COMMIT,
+    which runs with synchronous=FULL, so a resolved Future means the write is on
+    disk while the fsync is shared by the whole group. Each writer serves one
+    database file.
+    """
+    def __init__(self, path, max_batch=256, max_latency=0.002):
+        self.path = path
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.requests = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+        self.thread.start()
+    def submit(self, operation):
+        future = Future()
+        self.requests.put((operation, future))
+        return future
+    def stop(self):
+        self.requests.put(None)
+        self.thread.join()
+    def _next_batch(self):
+        first = self.requests.get()
+        if first is None: return None
+        batch, deadline = [first], time_module.monotonic() + self.max_latency
+        while len(batch) < self.max_batch:
+            try: request = self.requests.get(timeout=max(0, deadline - time_module.monotonic()))
+            except queue.Empty: break
+            if request is None:
+                self.requests.put(None)
+                break
+            batch.append(request)
+        return batch
+    def _run(self):
+        _local.db_file = self.path
+        get_connection().execute("PRAGMA synchronous = FULL")
+        while (batch := self._next_batch()) is not None:
+            results = []
+            try:
+                with atomic(immediate=True) as cursor:
+                    for operation, future in batch:
+                        if not future.set_running_or_notify_cancel(): continue
+                        cursor.execute("SAVEPOINT operation")
+                        try:
+                            results.append((future, operation(cursor), None))
+                            cursor.execute("RELEASE operation")
+                        except Exception as e:
+                            cursor.execute("ROLLBACK TO operation")
+                            cursor.execute("RELEASE operation")
+                            _local.rollback_only = False
+                            results.append((future, None, e))
+                metrics.count("group_commits")
+                metrics.count("group_commit_operations", len(batch))
+            except Exception as e:
+                results = [(future, None, e) for _, future in batch if not future.cancelled()]
+            for future, result, error in results:
+                if error is None: future.set_result(result)
+                else: future.set_exception(error)
+        close_connections()
+_group_commit = None
+_writers = {}
+_writers_lock = threading.Lock()
+def start_group_commit(max_batch=256, max_latency=0.002):
+    """Route the single-row write paths through GroupCommitWriters until stop_group_commit().
+
+    Writers are started on first use, one per database file, so shards commit in parallel.
+    """
+    global _group_commit
+    _group_commit = (max_batch, max_latency)
+def stop_group_commit():
+    global _group_commit
+    with _writers_lock:
+        _group_commit = None
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers: writer.stop()
+def _writer_for(path):
+    with _writers_lock:
+        writer = _writers.get(path)
+        if writer is None and _group_commit: writer = _writers[path] = GroupCommitWriter(path, *_group_commit)
+        return writer
+def run_write(operation, immediate=False):
+    # Runs `operation(cursor)` in its own transaction, or through the group-commit writer
+    # when one is running. Calls made inside an open transaction join it, as atomic() does.
+    # `immediate` takes the write lock before the operation's first read; group commits
+    # always hold it.
+    writer = None if _group_commit is None or getattr(_local, "depth", 0) else _writer_for(_current_file())
+    if writer is None:
+        with atomic(immediate=immediate) as cursor: return operation(cursor)
+    return writer.submit(operation).result()
+def _bump_write_generation():
+    global _write_generation
+    _write_generation += 1
+def write_generation():
+    return _write_generation
+@contextmanager
+def read_cursor():
+    cursor = get_connection().cursor()
+    try: yield cursor
+    finally: cursor.close()
 
+# Money columns hold integer paise.
+ACCOUNTS_COLUMNS = """
+    account_number TEXT PRIMARY KEY, name TEXT NOT NULL, balance INTEGER NOT NULL,
+    password_hash TEXT NOT NULL, role TEXT NOT NULL DEFAULT 'user',
+    failed_attempts INTEGER NOT NULL DEFAULT 0, is_locked INTEGER NOT NULL DEFAULT 0
+"""
+TRANSACTIONS_COLUMNS = """
+    id INTEGER PRIMARY KEY AUTOINCREMENT, account_number TEXT NOT NULL, date TEXT NOT NULL,
+    trans_type TEXT NOT NULL, amount INTEGER NOT NULL, balance INTEGER NOT NULL,
+    FOREIGN KEY (account_number) REFERENCES accounts (account_number)
+"""
+
+@metrics.timed
 def init_database():
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS accounts (
-                account_number TEXT PRIMARY KEY, name TEXT NOT NULL, balance REAL NOT NULL,
-                password_hash TEXT NOT NULL, role TEXT NOT NULL DEFAULT 'user',
-                failed_attempts INTEGER NOT NULL DEFAULT 0, is_locked INTEGER NOT NULL DEFAULT 0
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS transactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT, account_number TEXT NOT NULL, date TEXT NOT NULL,
-                trans_type TEXT NOT NULL, amount REAL NOT NULL, balance REAL NOT NULL,
-                FOREIGN KEY (account_number) REFERENCES accounts (account_number)
-            )
-        """)
+    _create_tables()
+    migrate_database()
+    configure_shards()
+    for path in shard_files() if SHARDS else ():
+        with using(path):
+            _create_tables()
+            migrate_database()
+    recover_transfers()
+    prune_transfers()
+def _create_tables():
+    with atomic() as cursor:
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS accounts ({ACCOUNTS_COLUMNS})")
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS transactions ({TRANSACTIONS_COLUMNS})")
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS audit_log (
                 id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, admin_user TEXT NOT NULL,
@@ -35,118 +274,779 @@ def init_database():
             )
         """)
         cursor.execute("INSERT OR IGNORE INTO system_config (key, value) VALUES ('interest_rate', '2.5')")
-        conn.commit()
-def backup_database():
-    try:
-        backup_file = os.path.join(SCRIPT_DIR, f"accounts_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db")
-        shutil.copy(DB_FILE, backup_file)
-        print(f"Backup successfully created: {backup_file}")
-    except FileNotFoundError:
+        cursor.execute("INSERT OR IGNORE INTO system_config (key, value) VALUES ('bcrypt_rounds', '12')")
+def configure_shards():
+    """Reconcile SHARDS with the count recorded in DB_FILE and return it.
+
+    An unset SHARDS adopts the recorded count, and an unsharded database with no
+    accounts yet takes the configured one. Any other mismatch raises ValueError,
+    since moving accounts between shards is not supported.
+    """
+    global SHARDS
+    with using(DB_FILE), atomic(immediate=not READ_ONLY) as cursor:
+        cursor.execute("SELECT value FROM system_config WHERE key = 'shard_count'")
+        row = cursor.fetchone()
+        recorded = int(row[0]) if row else 0
+        if SHARDS and SHARDS != recorded:
+            if recorded or cursor.execute("SELECT 1 FROM accounts LIMIT 1").fetchone():
+                raise ValueError(f"{DB_FILE} holds {recorded} shard(s) of accounts; it cannot be reopened with {SHARDS}.")
+            recorded = SHARDS
+        if (row is None or recorded != int(row[0])) and not READ_ONLY:
+            cursor.execute("INSERT OR REPLACE INTO system_config (key, value) VALUES ('shard_count', ?)", (str(recorded),))
+        SHARDS = recorded
+        return SHARDS
+def _add_history_indexes(cursor):
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_account_date ON transactions (account_number, date, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_log_timestamp ON audit_log (timestamp)")
+def _store_money_as_paise(cursor):
+    # SQLite cannot change a column's type in place, so both tables are rebuilt with
+    # INTEGER money columns and the rupee values rounded to whole paise.
+    cursor.execute(f"CREATE TABLE accounts_paise ({ACCOUNTS_COLUMNS})")
+    cursor.execute("INSERT INTO accounts_paise SELECT account_number, name, CAST(ROUND(balance * 100) AS INTEGER), "
+                   "password_hash, role, failed_attempts, is_locked FROM accounts")
+    cursor.execute(f"CREATE TABLE transactions_paise ({TRANSACTIONS_COLUMNS})")
+    cursor.execute("INSERT INTO transactions_paise SELECT id, account_number, date, trans_type, "
+                   "CAST(ROUND(amount * 100) AS INTEGER), CAST(ROUND(balance * 100) AS INTEGER) FROM transactions")
+    cursor.execute("DROP TABLE transactions")
+    cursor.execute("DROP TABLE accounts")
+    cursor.execute("ALTER TABLE accounts_paise RENAME TO accounts")
+    cursor.execute("ALTER TABLE transactions_paise RENAME TO transactions")
+    _add_history_indexes(cursor)
+def _add_daily_balances(cursor):
+    # One end-of-day balance per account and day, seeded from the last ledger row of each day.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_balances (
+            account_number TEXT NOT NULL, day TEXT NOT NULL, balance INTEGER NOT NULL,
+            PRIMARY KEY (account_number, day)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        INSERT OR REPLACE INTO daily_balances (account_number, day, balance)
+        SELECT account_number, day, balance FROM (
+            SELECT account_number, substr(date, 1, 10) AS day, balance, ROW_NUMBER() OVER (
+                PARTITION BY account_number, substr(date, 1, 10) ORDER BY date DESC, id DESC) AS position
+            FROM transactions
+        ) WHERE position = 1
+    """)
+def _add_transaction_date_index(cursor):
+    # Covers the bank-wide reporting aggregates, which range over date alone.
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (date, trans_type, amount)")
+def _add_audit_filter_indexes(cursor):
+    # Filtered audit pages walk one of these newest-first instead of scanning the whole log.
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_log_action ON audit_log (action, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_log_target ON audit_log (target_user, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_audit_log_admin ON audit_log (admin_user, timestamp)")
+def _add_transfer_outbox(cursor):
+    # Transfers between shards: the sender's shard records the transfer in its outbox in
+    # the same transaction as the debit, and the recipient's shard records it in its inbox
+    # with the credit, so delivery can be retried without crediting twice.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS transfer_outbox (
+            id TEXT PRIMARY KEY, created TEXT NOT NULL, from_account TEXT NOT NULL, to_account TEXT NOT NULL,
+            amount INTEGER NOT NULL, state TEXT NOT NULL DEFAULT 'pending'
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transfer_outbox_pending ON transfer_outbox (created) WHERE state = 'pending'")
+    cursor.execute("CREATE TABLE IF NOT EXISTS transfer_inbox (id TEXT PRIMARY KEY, transaction_id INTEGER NOT NULL)")
+def _add_transfer_inbox_state(cursor):
+    # Shards restored from backups taken at different moments can hold a credit without its
+    # debit; the inbox records what it credited so recover_transfers() can reverse it.
+    cursor.execute("ALTER TABLE transfer_inbox ADD COLUMN to_account TEXT")
+    cursor.execute("ALTER TABLE transfer_inbox ADD COLUMN amount INTEGER")
+    cursor.execute("ALTER TABLE transfer_inbox ADD COLUMN state TEXT NOT NULL DEFAULT 'credited'")
+    cursor.execute("UPDATE transfer_inbox SET (to_account, amount) = "
+                   "(SELECT account_number, amount FROM transactions WHERE id = transfer_inbox.transaction_id)")
+def _add_transfer_inbox_created(cursor):
+    # Settled transfers are pruned by age (prune_transfers), so both sides need an indexed date.
+    cursor.execute("ALTER TABLE transfer_inbox ADD COLUMN created TEXT")
+    cursor.execute("UPDATE transfer_inbox SET created = COALESCE("
+                   "(SELECT date FROM transactions WHERE id = transfer_inbox.transaction_id), ?)", (datetime.now().isoformat(),))
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transfer_inbox_created ON transfer_inbox (created)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transfer_outbox_created ON transfer_outbox (created)")
+# Schema migrations, applied in order. PRAGMA user_version records how many have run,
+# so append new steps to the end and never reorder or remove existing ones.
+MIGRATIONS = [
+    _add_history_indexes,
+    _store_money_as_paise,
+    _add_daily_balances,
+    _add_transaction_date_index,
+    _add_audit_filter_indexes,
+    _add_transfer_outbox,
+    _add_transfer_inbox_state,
+    _add_transfer_inbox_created,
+]
+# Every ledger write also upserts the account's end-of-day balance. Rows are written in
+# date order, so the latest write of a day is that day's closing balance.
+SNAPSHOT_SQL = ("INSERT INTO daily_balances (account_number, day, balance) VALUES (?, substr(?, 1, 10), ?) "
+                "ON CONFLICT (account_number, day) DO UPDATE SET balance = excluded.balance")
+@metrics.timed
+def migrate_database():
+    with read_cursor() as cursor:
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        with atomic(immediate=True) as cursor:
+            # Another process may have applied this step since the version was read above;
+            # holding the write lock, the version read here is current.
+            applied = cursor.execute("PRAGMA user_version").fetchone()[0] < number
+            if applied:
+                migration(cursor)
+                cursor.execute(f"PRAGMA user_version = {number}")
+        if applied: print(f"Applied database migration {number}: {migration.__name__.strip('_')}")
+BACKUP_PREFIX = "accounts_backup_"
+INCREMENTAL_PREFIX = "accounts_incremental_"
+def _backup_name(prefix, extension, compress, stamp=None, suffix=""):
+    stamp = stamp or datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    return f"{prefix}{stamp}{suffix}{extension}{'.gz' if compress else ''}"
+def _gzip_file(source, destination):
+    with open(source, "rb") as raw, gzip.open(destination, "wb", compresslevel=6) as packed:
+        shutil.copyfileobj(raw, packed, 1 << 20)
+def _prune_backups(directory, keep):
+    # A backup is the DB_FILE copy plus one file per shard, all with the same timestamp.
+    backups = [name for name in os.listdir(directory) if name.startswith(BACKUP_PREFIX) and not name.endswith(".partial")]
+    stamp = lambda name: name[len(BACKUP_PREFIX):].split(".")[0].split("_shard")[0]
+    expired = set(sorted({stamp(name) for name in backups})[:-keep]) if keep else set()
+    for name in sorted(backups):
+        if stamp(name) not in expired: continue
+        os.remove(os.path.join(directory, name))
+        print(f"Removed old backup: {name}")
+@metrics.timed
+def backup_database(directory=None, compress=False, keep=None, pages=1024, pause=0.01):
+    """Copy the live database with SQLite's online backup API; returns the backup path.
+
+    The copy is taken from one read transaction, so it is a consistent snapshot,
+    and in WAL mode writers carry on while it runs. It proceeds ``pages`` pages at
+    a time with a ``pause`` between steps to leave I/O for live traffic. The file
+    is written under a temporary name and renamed when complete; ``keep`` limits
+    how many full backups are kept in ``directory``. With shards every shard file
+    is copied alongside, named ``..._shardN``. Each copy is consistent on its own
+    but they are taken one after another, so a cross-shard transfer can be debited
+    in one copy and not yet credited in another, or the reverse; on startup after
+    a restore run ``python backup.py --reconcile-transfers`` (recover_transfers
+    with ``reconcile``) once to deliver or reverse the other leg.
+    """
+    if not os.path.exists(DB_FILE):
         print("Database file not found. Nothing to back up.")
+        return None
+    directory = directory or SCRIPT_DIR
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    written = []
+    try:
+        for index, path in enumerate(database_files()):
+            suffix = f"_shard{index - 1}" if index else ""
+            written.append(_backup_file(path, os.path.join(directory, _backup_name(BACKUP_PREFIX, ".db", compress, stamp, suffix)),
+                                        compress, pages, pause))
+        print(f"Backup successfully created: {written[0]}" + (f" (+{len(written) - 1} shard files)" if len(written) > 1 else ""))
+        _prune_backups(directory, keep)
+        return written[0]
     except Exception as e:
         print(f"An error occurred during backup: {e}")
+        for leftover in written:
+            if os.path.exists(leftover): os.remove(leftover)
+        return None
+def _backup_file(path, backup_file, compress, pages, pause):
+    partial = f"{backup_file}.partial"
+    source = sqlite3.connect(path)
+    try:
+        source.execute("BEGIN")
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        target = sqlite3.connect(partial)
+        try: source.backup(target, pages=pages, progress=lambda status, remaining, total: time_module.sleep(pause) if remaining else None)
+        finally: target.close()
+        source.rollback()
+        if compress:
+            _gzip_file(partial, f"{partial}.gz")
+            os.remove(partial)
+            partial = f"{partial}.gz"
+        os.replace(partial, backup_file)
+        return backup_file
+    except Exception:
+        for leftover in (partial, f"{partial}.gz"):
+            if os.path.exists(leftover): os.remove(leftover)
+        raise
+    finally: source.close()
+def _get_checkpoint(cursor, key):
+    cursor.execute("SELECT value FROM system_config WHERE key = ?", (key,))
+    row = cursor.fetchone()
+    if not row: return 0
+    value = json.loads(row[0])
+    return value[-1] if isinstance(value, list) else value  # older exports stored [date, id]
+@metrics.timed
+def export_incremental(directory=None, compress=False):
+    """Export ledger and audit rows added since the last export as JSON Lines.
+
+    Rows are selected by id past the checkpoint stored in system_config, which
+    advances only once the file is complete; ids are AUTOINCREMENT, so within a
+    file they grow in commit order and no row is skipped or exported twice. Replaying a
+    full backup followed by its incrementals in order restores the ledger and
+    audit log; account details other than balances need a full backup. With
+    shards, ledger rows carry a ``shard`` field and each shard has its own
+    checkpoint. Returns ``(path, rows)``, or ``(None, 0)`` on error.
+    """
+    directory = directory or SCRIPT_DIR
+    os.makedirs(directory, exist_ok=True)
+    export_file = os.path.join(directory, _backup_name(INCREMENTAL_PREFIX, ".jsonl", compress))
+    partial = f"{export_file}.partial"
+    ledger = ("transactions", "backup_checkpoint_transactions")
+    audit = ("audit_log", "backup_checkpoint_audit_log")
+    if SHARDS:
+        sources = [(DB_FILE, None, [audit])] + [(path, index, [(ledger[0], f"{ledger[1]}_shard{index}")])
+                                                for index, path in enumerate(shard_files())]
+    else: sources = [(DB_FILE, None, [ledger, audit])]
+    checkpoints, rows = {}, 0
+    try:
+        with read_cursor() as cursor:
+            for _, _, tables in sources:
+                for _, key in tables: checkpoints[key] = _get_checkpoint(cursor, key)
+        with (gzip.open(partial, "wt") if compress else open(partial, "w")) as out:
+            for path, shard, tables in sources:
+                with using(path), read_cursor() as cursor:
+                    cursor.execute("BEGIN")
+                    try:
+                        for table, key in tables:
+                            cursor.execute(f"SELECT * FROM {table} WHERE id > ? ORDER BY id", (checkpoints[key],))
+                            columns = [column[0] for column in cursor.description]
+                            extra = {} if shard is None else {"shard": shard}
+                            while batch := cursor.fetchmany(1000):
+                                for row in batch: out.write(json.dumps({"table": table, **extra, "row": dict(zip(columns, row))}) + "\n")
+                                checkpoints[key] = batch[-1][0]
+                                rows += len(batch)
+                    finally: cursor.execute("COMMIT")
+        os.replace(partial, export_file)
+        with atomic() as cursor:
+            cursor.executemany("INSERT OR REPLACE INTO system_config (key, value) VALUES (?, ?)",
+                               [(key, json.dumps(value)) for key, value in checkpoints.items()])
+        print(f"Incremental export created: {export_file} ({rows} rows)")
+        return export_file, rows
+    except Exception as e:
+        print(f"An error occurred during incremental export: {e}")
+        if os.path.exists(partial): os.remove(partial)
+        return None, 0
+@metrics.timed
 def load_all_accounts():
     if not os.path.exists(DB_FILE): return {}
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM accounts")
-        return {row[0]: row for row in cursor.fetchall()}
+    accounts = {}
+    for rows in _across_shards(_select, "SELECT * FROM accounts"): accounts.update((row[0], row) for row in rows)
+    return accounts
+def _select(sql, params=()):
+    with read_cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+@metrics.timed
+@by_account
+def load_account(account_number):
+    with read_cursor() as cursor:
+        cursor.execute("SELECT * FROM accounts WHERE account_number = ?", (account_number,))
+        return cursor.fetchone()
+@metrics.timed
+def load_account_numbers(role=None):
+    if role is None: shards = _across_shards(_select, "SELECT account_number FROM accounts ORDER BY account_number")
+    else: shards = _across_shards(_select, "SELECT account_number FROM accounts WHERE role = ? ORDER BY account_number", (role,))
+    return [row[0] for row in heapq.merge(*shards)]
+@metrics.timed
+def load_account_page(after=None, limit=100, role='user'):
+    # Keyset pagination over account numbers: `after` is the last account of the previous page.
+    shards = _across_shards(_select, "SELECT account_number, name, balance, is_locked FROM accounts WHERE role = ? AND account_number > ? "
+                                     "ORDER BY account_number LIMIT ?", (role, after or "", limit))
+    return list(islice(heapq.merge(*shards), limit))
+@metrics.timed
+@by_account
 def load_transactions_for_account(account_number):
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
+    with read_cursor() as cursor:
         cursor.execute("SELECT date, trans_type, amount, balance FROM transactions WHERE account_number = ? ORDER BY date DESC", (account_number,))
         return [(datetime.fromisoformat(date), t_type, amt, bal) for date, t_type, amt, bal in cursor.fetchall()]
+@metrics.timed
+@by_account
+def load_transaction_page(account_number, before=None, limit=100, start=None, end=None):
+    # Keyset pagination: `before` is the (date, id) of the last row of the previous page.
+    # `start`/`end` optionally restrict the rows to start <= date < end.
+    sql = "SELECT id, date, trans_type, amount, balance FROM transactions WHERE account_number = ?"
+    params = [account_number]
+    if before is not None:
+        sql += " AND (date < ? OR (date = ? AND id < ?))"
+        params += [before[0], before[0], before[1]]
+    if start is not None:
+        sql += " AND date >= ?"
+        params.append(start.isoformat())
+    if end is not None:
+        sql += " AND date < ?"
+        params.append(end.isoformat())
+    with read_cursor() as cursor:
+        cursor.execute(sql + " ORDER BY date DESC, id DESC LIMIT ?", params + [limit])
+        return [(t_id, datetime.fromisoformat(date), t_type, amt, bal) for t_id, date, t_type, amt, bal in cursor.fetchall()]
+@metrics.timed
+@by_account
+def get_balance_at(account_number, when):
+    # Balance just before `when` (a date means its end of day): the previous day's
+    # snapshot plus a tail scan of the rows earlier on the same day. None if the
+    # account had no ledger rows yet.
+    if not isinstance(when, datetime): when = datetime.combine(when + timedelta(days=1), time.min)
+    day = when.date().isoformat()
+    with read_cursor() as cursor:
+        cursor.execute("SELECT balance FROM transactions WHERE account_number = ? AND date >= ? AND date < ? "
+                       "ORDER BY date DESC, id DESC LIMIT 1", (account_number, day, when.isoformat()))
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute("SELECT balance FROM daily_balances WHERE account_number = ? AND day < ? "
+                           "ORDER BY day DESC LIMIT 1", (account_number, day))
+            row = cursor.fetchone()
+        return row[0] if row else None
+@metrics.timed
+def load_balances_on(day, role='user'):
+    # Closing balance of every account on `day` (a date), e.g. for month-end reporting.
+    shards = _across_shards(_select, "SELECT a.account_number, (SELECT d.balance FROM daily_balances d WHERE d.account_number = a.account_number "
+                                     "AND d.day <= ? ORDER BY d.day DESC LIMIT 1) FROM accounts a WHERE a.role = ? ORDER BY a.account_number",
+                            (day.isoformat(), role))
+    return [(acc, balance) for acc, balance in heapq.merge(*shards) if balance is not None]
+@metrics.timed
+def load_bank_totals(role='user'):
+    # (accounts, locked accounts, total balance, smallest balance, largest balance)
+    shards = [rows[0] for rows in _across_shards(_select, "SELECT COUNT(*), COALESCE(SUM(is_locked), 0), COALESCE(SUM(balance), 0), "
+                                                          "MIN(balance), MAX(balance) FROM accounts WHERE role = ?", (role,))]
+    lows, highs = [row[3] for row in shards if row[3] is not None], [row[4] for row in shards if row[4] is not None]
+    return (sum(row[0] for row in shards), sum(row[1] for row in shards), sum(row[2] for row in shards),
+            min(lows, default=None), max(highs, default=None))
+def _sum_groups(shards):
+    # Adds up per-shard (key, value, ...) rows that share a key, ordered by key.
+    totals = {}
+    for rows in shards:
+        for key, *values in rows:
+            totals[key] = [a + b for a, b in zip(totals[key], values)] if key in totals else values
+    return [(key, *values) for key, values in sorted(totals.items())]
+@metrics.timed
+def load_totals_by_type(since=None):
+    # (trans_type, count, total amount) over ledger rows dated at or after `since`.
+    return _sum_groups(_across_shards(_select, "SELECT trans_type, COUNT(*), SUM(amount) FROM transactions WHERE date >= ? "
+                                               "GROUP BY trans_type ORDER BY trans_type", (since.isoformat() if since else "",)))
+@metrics.timed
+def load_daily_flows(since, credit_types, debit_types):
+    # (day, inflow, outflow) per day from `since`, in paise.
+    credits, debits = ",".join("?" * len(credit_types)), ",".join("?" * len(debit_types))
+    return _sum_groups(_across_shards(_select, f"SELECT substr(date, 1, 10) AS day, "
+                                               f"SUM(CASE WHEN trans_type IN ({credits}) THEN amount ELSE 0 END), "
+                                               f"SUM(CASE WHEN trans_type IN ({debits}) THEN amount ELSE 0 END) "
+                                               f"FROM transactions WHERE date >= ? GROUP BY day ORDER BY day",
+                                      (*credit_types, *debit_types, since.isoformat())))
+@metrics.timed
+def load_top_balances(limit=10, role='user'):
+    shards = _across_shards(_select, "SELECT account_number, name, balance FROM accounts WHERE role = ? ORDER BY balance DESC LIMIT ?", (role, limit))
+    return list(islice(heapq.merge(*shards, key=lambda row: -row[2]), limit))
+@metrics.timed
+def load_balance_histogram(low, width, role='user'):
+    # (bucket, count) with bucket = (balance - low) // width, for equal-width buckets.
+    return _sum_groups(_across_shards(_select, "SELECT (balance - ?) / ? AS bucket, COUNT(*) FROM accounts WHERE role = ? "
+                                               "GROUP BY bucket ORDER BY bucket", (low, width, role)))
+@metrics.timed
+@by_account
 def create_new_account(account):
     try:
-        with sqlite3.connect(DB_FILE) as conn:
-            cursor = conn.cursor()
+        with atomic() as cursor:
             cursor.execute("INSERT INTO accounts VALUES (?, ?, ?, ?, ?, ?, ?)", (
-                account.account_number, account.name, account.balance, account.password_hash,
+                account.account_number, account.name, account.balance_paise, account.password_hash,
                 account.role, account.failed_attempts, int(account.is_locked)
             ))
             initial_transaction = account.transactions[0]
             cursor.execute("INSERT INTO transactions (account_number, date, trans_type, amount, balance) VALUES (?, ?, ?, ?, ?)", (
                 account.account_number, initial_transaction[0].isoformat(), initial_transaction[1], initial_transaction[2], initial_transaction[3]
             ))
-            conn.commit()
+            cursor.execute(SNAPSHOT_SQL, (account.account_number, initial_transaction[0].isoformat(), initial_transaction[3]))
             return True
     except sqlite3.IntegrityError: return False
+@metrics.timed
+@by_account
 def delete_account_and_transactions(account_number):
     try:
-        with sqlite3.connect(DB_FILE) as conn:
-            cursor = conn.cursor()
+        with atomic() as cursor:
             cursor.execute("DELETE FROM transactions WHERE account_number = ?", (account_number,))
+            cursor.execute("DELETE FROM daily_balances WHERE account_number = ?", (account_number,))
             cursor.execute("DELETE FROM accounts WHERE account_number = ?", (account_number,))
-            conn.commit()
             return True
     except sqlite3.Error as e:
         print(f"DB Error on delete: {e}")
         return False
+@metrics.timed
+@by_account
 def save_new_transaction(account_number, transaction):
-    try:
-        with sqlite3.connect(DB_FILE) as conn:
-            cursor = conn.cursor()
-            cursor.execute("INSERT INTO transactions (account_number, date, trans_type, amount, balance) VALUES (?, ?, ?, ?, ?)", (
-                account_number, transaction[0].isoformat(), transaction[1], transaction[2], transaction[3]))
-            conn.commit()
+    def write(cursor):
+        cursor.execute("INSERT INTO transactions (account_number, date, trans_type, amount, balance) VALUES (?, ?, ?, ?, ?)", (
+            account_number, transaction[0].isoformat(), transaction[1], transaction[2], transaction[3]))
+        cursor.execute(SNAPSHOT_SQL, (account_number, transaction[0].isoformat(), transaction[3]))
+    try: run_write(write)
     except sqlite3.Error as e: print(f"Database error saving transaction: {e}")
-def update_account_state(account):
+def _post(cursor, account_number, trans_type, amount, delta, overdraw=False):
+    # Amounts are integer paise (one too large to bind raises OverflowError). A debit
+    # (negative delta) only applies if it leaves the balance non-negative, unless
+    # `overdraw`; returns the ledger row, or None if nothing was applied.
+    cursor.execute("UPDATE accounts SET balance = balance + ? WHERE account_number = ? AND (? OR balance + ? >= 0)",
+                   (delta, account_number, overdraw, delta))
+    if cursor.rowcount != 1: return None
+    cursor.execute("SELECT balance FROM accounts WHERE account_number = ?", (account_number,))
+    transaction = (datetime.now(), trans_type, amount, cursor.fetchone()[0])
+    cursor.execute("INSERT INTO transactions (account_number, date, trans_type, amount, balance) VALUES (?, ?, ?, ?, ?)", (
+        account_number, transaction[0].isoformat(), transaction[1], transaction[2], transaction[3]))
+    cursor.execute(SNAPSHOT_SQL, (account_number, transaction[0].isoformat(), transaction[3]))
+    return transaction
+@metrics.timed
+@by_account
+def execute_posting(account_number, trans_type, amount, delta):
+    # Ledger row and balance change commit together.
+    try:
+        return run_write(lambda cursor: _post(cursor, account_number, trans_type, amount, delta))
+    except (sqlite3.Error, OverflowError) as e:
+        print(f"Database error posting transaction: {e}")
+        return None
+@metrics.timed
+def apply_interest_to_all(annual_rate, admin_user, details=""):
+    # Set-based interest run: every eligible ledger row, balance update and the audit
+    # entry commit together, so a month-end run is all-or-nothing. With shards each
+    # shard's run commits on its own and the audit entry follows the last one.
+    date = datetime.now().isoformat()
+    try:
+        if not SHARDS:
+            with atomic() as cursor:
+                credited = _credit_interest(cursor, annual_rate, date)
+                # Written on this cursor so a failed audit insert fails the run instead of
+                # being swallowed by log_admin_action while the run rolls back.
+                _audit(cursor, admin_user, "APPLY_INTEREST", "ALL_USERS", details)
+                return credited
+        credited = 0
+        for path in shard_files():
+            with using(path), atomic() as cursor: credited += _credit_interest(cursor, annual_rate, date)
+        log_admin_action(admin_user, "APPLY_INTEREST", "ALL_USERS", details)
+        return credited
+    except sqlite3.Error as e:
+        print(f"Database error applying interest: {e}")
+        return None
+def _credit_interest(cursor, annual_rate, date):
+    cursor.execute("INSERT INTO transactions (account_number, date, trans_type, amount, balance) "
+                   "SELECT account_number, ?, 'Credit Interest', CAST(ROUND(balance * ?) AS INTEGER), "
+                   "balance + CAST(ROUND(balance * ?) AS INTEGER) FROM accounts WHERE role = 'user' AND balance > 0",
+                   (date, annual_rate, annual_rate))
+    credited = cursor.rowcount
+    cursor.execute("UPDATE accounts SET balance = balance + CAST(ROUND(balance * ?) AS INTEGER) "
+                   "WHERE role = 'user' AND balance > 0", (annual_rate,))
+    cursor.execute("INSERT INTO daily_balances (account_number, day, balance) "
+                   "SELECT account_number, substr(?, 1, 10), balance FROM accounts WHERE role = 'user' AND balance > 0 "
+                   "ON CONFLICT (account_number, day) DO UPDATE SET balance = excluded.balance", (date,))
+    return credited
+@metrics.timed
+def load_balances(account_numbers=None):
+    balances = {}
+    if account_numbers is None:
+        for rows in _across_shards(_select, "SELECT account_number, balance FROM accounts"): balances.update(rows)
+        return balances
+    by_shard = {}
+    for account_number in account_numbers: by_shard.setdefault(shard_for(account_number), []).append(account_number)
+    for path, numbers in by_shard.items():
+        for i in range(0, len(numbers), 500):
+            chunk = numbers[i:i + 500]
+            with using(path):
+                balances.update(_select(f"SELECT account_number, balance FROM accounts WHERE account_number IN ({','.join('?' * len(chunk))})", chunk))
+    return balances
+@metrics.timed
+def post_batch(postings):
+    """Apply many postings in one immediate transaction using executemany.
+
+    Each posting is a list of legs ``(account_number, trans_type, amount, delta)``
+    (amounts in paise) that succeed or fail together, e.g. the two legs of a
+    transfer. Legs are applied in order against running balances; a posting that
+    names a missing account or would overdraw one is skipped. Returns the indexes
+    of the skipped postings with a reason, or None if the batch failed as a whole.
+
+    With shards, postings are batched per shard and transfers between shards go
+    through execute_transfer; the batches of both shards a transfer touches are
+    posted first, so every account still sees its postings in order.
+    """
+    if not SHARDS: return _post_batch(postings)
+    by_shard, rejected = {}, []
+    def flush(path):
+        indexes = by_shard.pop(path, [])
+        if not indexes: return
+        with using(path): failures = _post_batch([postings[i] for i in indexes])
+        if failures is None: rejected.extend((i, "Database error; not posted.") for i in indexes)
+        else: rejected.extend((indexes[i], reason) for i, reason in failures)
+    for index, posting in enumerate(postings):
+        paths = {shard_for(leg[0]) for leg in posting}
+        if len(paths) == 1:
+            by_shard.setdefault(paths.pop(), []).append(index)
+            continue
+        for path in paths: flush(path)
+        (from_account_number, _, amount, _), (to_account_number, _, _, _) = posting
+        if not execute_transfer(from_account_number, to_account_number, amount):
+            rejected.append((index, _transfer_failure(from_account_number, to_account_number, amount)))
+    for path in list(by_shard): flush(path)
+    return sorted(rejected)
+def _transfer_failure(from_account_number, to_account_number, amount):
+    # Why execute_transfer returned None, in the wording _post_batch uses.
+    balances = load_balances([from_account_number, to_account_number])
+    for account_number in (from_account_number, to_account_number):
+        if account_number not in balances: return f"Account {account_number} not found."
+    if balances[from_account_number] < amount: return f"Insufficient balance in {from_account_number}."
+    return "Database error; not posted."
+def _post_batch(postings):
+    rejected = []
     try:
-        with sqlite3.connect(DB_FILE) as conn:
-            cursor = conn.cursor()
-            cursor.execute("UPDATE accounts SET name = ?, balance = ?, failed_attempts = ?, is_locked = ? WHERE account_number = ?", (
-                account.name, account.balance, account.failed_attempts, int(account.is_locked), account.account_number))
-            conn.commit()
+        with atomic(immediate=True) as cursor:
+            accounts = sorted({leg[0] for posting in postings for leg in posting})
+            balances = {}
+            for i in range(0, len(accounts), 500):
+                chunk = accounts[i:i + 500]
+                cursor.execute(f"SELECT account_number, balance FROM accounts WHERE account_number IN ({','.join('?' * len(chunk))})", chunk)
+                balances.update(cursor.fetchall())
+            date = datetime.now().isoformat()
+            ledger_rows = []
+            for index, posting in enumerate(postings):
+                pending = {}
+                for account_number, _, _, delta in posting:
+                    if account_number not in balances:
+                        rejected.append((index, f"Account {account_number} not found."))
+                        break
+                    new_balance = pending.get(account_number, balances[account_number]) + delta
+                    if new_balance < 0:
+                        rejected.append((index, f"Insufficient balance in {account_number}."))
+                        break
+                    pending[account_number] = new_balance
+                else:
+                    for account_number, trans_type, amount, delta in posting:
+                        balances[account_number] += delta
+                        ledger_rows.append((account_number, date, trans_type, amount, balances[account_number]))
+            cursor.executemany("INSERT INTO transactions (account_number, date, trans_type, amount, balance) VALUES (?, ?, ?, ?, ?)", ledger_rows)
+            touched = {row[0] for row in ledger_rows}
+            cursor.executemany("UPDATE accounts SET balance = ? WHERE account_number = ?", [(balances[acc], acc) for acc in touched])
+            cursor.executemany(SNAPSHOT_SQL, [(acc, date, balances[acc]) for acc in touched])
+        return rejected
+    except (sqlite3.Error, OverflowError) as e:
+        print(f"Database error posting batch: {e}")
+        return None
+@metrics.timed
+@by_account
+def update_account_state(account):
+    # Balances only change through postings, so a stale in-memory balance is never written back.
+    state = (account.name, account.failed_attempts, int(account.is_locked), account.account_number)
+    try: run_write(lambda cursor: cursor.execute("UPDATE accounts SET name = ?, failed_attempts = ?, is_locked = ? WHERE account_number = ?", state))
     except sqlite3.Error as e: print(f"Database error updating account state: {e}")
+@metrics.timed
+@by_account
 def update_password(account_number, new_password_hash):
     try:
-        with sqlite3.connect(DB_FILE) as conn:
-            cursor = conn.cursor()
-            cursor.execute("UPDATE accounts SET password_hash = ? WHERE account_number = ?", (new_password_hash, account_number))
-            conn.commit()
-            return True
+        run_write(lambda cursor: cursor.execute("UPDATE accounts SET password_hash = ? WHERE account_number = ?", (new_password_hash, account_number)))
+        return True
     except sqlite3.Error as e:
         print(f"Database error updating password: {e}")
         return False
-def execute_transfer(from_account, to_account):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+@metrics.timed
+def execute_transfer(from_account_number, to_account_number, amount):
+    # Both legs commit together or not at all; returns the (from, to) ledger rows, or
+    # None if the sender lacks funds or either account is missing.
+    if shard_for(from_account_number) != shard_for(to_account_number):
+        return _transfer_across_shards(from_account_number, to_account_number, amount)
+    def write(cursor):
+        from_transaction = _post(cursor, from_account_number, "Transfer Out", amount, -amount)
+        if from_transaction is None: return None
+        to_transaction = _post(cursor, to_account_number, "Transfer In", amount, amount)
+        if to_transaction is None: raise sqlite3.IntegrityError(f"recipient {to_account_number} does not exist")
+        return from_transaction, to_transaction
     try:
-        cursor.execute("UPDATE accounts SET balance = ? WHERE account_number = ?", (from_account.balance, from_account.account_number))
-        cursor.execute("UPDATE accounts SET balance = ? WHERE account_number = ?", (to_account.balance, to_account.account_number))
-        from_transaction, to_transaction = from_account.transactions[-1], to_account.transactions[-1]
-        cursor.execute("INSERT INTO transactions (account_number, date, trans_type, amount, balance) VALUES (?, ?, ?, ?, ?)",
-            (from_account.account_number, from_transaction[0].isoformat(), from_transaction[1], from_transaction[2], from_transaction[3]))
-        cursor.execute("INSERT INTO transactions (account_number, date, trans_type, amount, balance) VALUES (?, ?, ?, ?, ?)",
-            (to_account.account_number, to_transaction[0].isoformat(), to_transaction[1], to_transaction[2], to_transaction[3]))
-        conn.commit()
-        return True
-    except sqlite3.Error as e:
-        conn.rollback()
+        with using(shard_for(from_account_number)): return run_write(write)
+    except (sqlite3.Error, OverflowError) as e:
         print(f"Transfer failed due to a database error: {e}")
-        return False
-    finally: conn.close()
-def log_admin_action(admin_user, action, target_user, details=""):
+        return None
+def _transfer_across_shards(from_account_number, to_account_number, amount):
+    """Move money between accounts on different shards without a shared transaction.
+
+    The debit commits together with a 'pending' row in the sender shard's
+    transfer_outbox; from then on the transfer will complete. The credit commits
+    together with a transfer_inbox row on the recipient's shard, which makes
+    redelivery a no-op, and the outbox row is then marked 'delivered' (or
+    'refunded' if the recipient is gone). recover_transfers() finishes outbox
+    rows left pending by a failed delivery or a crash; it runs at startup and
+    BankSystem also calls it periodically from transfers. Returns the (from, to) ledger rows; the second
+    is None if delivery failed and was left for recovery.
+    """
+    transfer_id = uuid.uuid4().hex
+    def debit(cursor):
+        transaction = _post(cursor, from_account_number, "Transfer Out", amount, -amount)
+        if transaction is None: return None
+        cursor.execute("INSERT INTO transfer_outbox (id, created, from_account, to_account, amount) VALUES (?, ?, ?, ?, ?)",
+                       (transfer_id, transaction[0].isoformat(), from_account_number, to_account_number, amount))
+        return transaction
     try:
-        with sqlite3.connect(DB_FILE) as conn:
-            cursor = conn.cursor()
-            timestamp = datetime.now().isoformat()
-            cursor.execute("INSERT INTO audit_log (timestamp, admin_user, action, target_user, details) VALUES (?, ?, ?, ?, ?)",
-                        (timestamp, admin_user, action, target_user, details))
-            conn.commit()
+        with using(shard_for(from_account_number)): from_transaction = run_write(debit)
+    except (sqlite3.Error, OverflowError) as e:
+        print(f"Transfer failed due to a database error: {e}")
+        return None
+    if from_transaction is None: return None
+    try: to_transaction = _deliver_transfer(transfer_id, from_account_number, to_account_number, amount)
+    except sqlite3.Error as e:
+        print(f"Transfer {transfer_id} debited but not yet delivered ({e}); recover_transfers() will complete it.")
+        return from_transaction, None
+    if to_transaction is None: return None
+    return from_transaction, to_transaction
+def _deliver_transfer(transfer_id, from_account_number, to_account_number, amount):
+    # Credits the recipient once, however often it is called; returns the credit's ledger
+    # row, or None if the recipient no longer exists and the sender was refunded.
+    def credit(cursor):
+        cursor.execute("SELECT t.date, t.trans_type, t.amount, t.balance FROM transfer_inbox i "
+                       "LEFT JOIN transactions t ON t.id = i.transaction_id WHERE i.id = ? AND i.state = 'credited'", (transfer_id,))
+        row = cursor.fetchone()
+        if row and row[0] is None: return (None, "Transfer In", amount, None)  # delivered; the recipient was deleted since
+        if row: return (datetime.fromisoformat(row[0]), *row[1:])
+        transaction = _post(cursor, to_account_number, "Transfer In", amount, amount)
+        if transaction is None: return None
+        # Replaces a credit reversed while this debit was missing from a restored shard.
+        cursor.execute("INSERT OR REPLACE INTO transfer_inbox (id, transaction_id, to_account, amount, created) "
+                       "SELECT ?, MAX(id), ?, ?, ? FROM transactions WHERE account_number = ?",
+                       (transfer_id, to_account_number, amount, transaction[0].isoformat(), to_account_number))
+        return transaction
+    def settle(cursor):
+        if to_transaction:
+            cursor.execute("UPDATE transfer_outbox SET state = 'delivered' WHERE id = ? AND state = 'pending'", (transfer_id,))
+            return
+        # A 'delivered' row is refunded too: after a restore its credit may be gone.
+        cursor.execute("UPDATE transfer_outbox SET state = 'refunded' WHERE id = ? AND state != 'refunded'", (transfer_id,))
+        if cursor.rowcount: _post(cursor, from_account_number, "Transfer Reversal", amount, amount)
+    # The inbox check must run under the write lock, or two deliveries of one transfer
+    # could both find no inbox row and credit the recipient twice.
+    with using(shard_for(to_account_number)): to_transaction = run_write(credit, immediate=True)
+    with using(shard_for(from_account_number)): run_write(settle)
+    return to_transaction
+# Settled cross-shard transfers older than this are pruned; a restore can only be
+# reconciled against backups younger than it.
+TRANSFER_RETENTION_DAYS = 90
+def _transfer_cutoff(days):
+    return (datetime.now() - timedelta(days=days)).isoformat()
+@metrics.timed
+def recover_transfers(reconcile=False):
+    """Complete cross-shard transfers whose outbox rows are still pending; returns how many.
+
+    Safe to run while transfers are in flight, since delivery is idempotent. With
+    ``reconcile`` every transfer within the retention window is checked on both
+    shards, as needed once after shards are restored from backups taken at
+    different moments: a debit whose credit is missing is delivered again (or
+    refunded), and a credit whose debit is missing or was refunded is reversed,
+    so money is neither lost nor created.
+    """
+    if not SHARDS: return 0
+    credited = {}
+    # A day inside the retention window, so a row one restored shard has pruned and
+    # another has not is never taken for half a transfer.
+    since = _transfer_cutoff(TRANSFER_RETENTION_DAYS - 1)
+    if reconcile:
+        # Inboxes are read before outboxes: an outbox row commits before its inbox row, so
+        # every debit of a credit read here is visible below unless the debit is really gone.
+        for path in shard_files():
+            with using(path):
+                for transfer_id, to_account_number, amount in _select(
+                        "SELECT id, to_account, amount FROM transfer_inbox "
+                        "WHERE created >= ? AND state = 'credited' AND to_account IS NOT NULL", (since,)):
+                    credited[transfer_id] = (to_account_number, amount)
+    recovered = reversed_credits = 0
+    for path in shard_files():
+        with using(path):
+            if reconcile:
+                outbox = _select("SELECT id, from_account, to_account, amount, state FROM transfer_outbox "
+                                 "WHERE created >= ? AND state != 'refunded' ORDER BY created", (since,))
+            else:
+                outbox = _select("SELECT id, from_account, to_account, amount, state FROM transfer_outbox "
+                                 "WHERE state = 'pending' ORDER BY created")
+        for transfer_id, from_account_number, to_account_number, amount, state in outbox:
+            # Credits left in `credited` afterwards have no live debit: refunded or missing.
+            if credited.pop(transfer_id, None) and state != "pending": continue
+            try: _deliver_transfer(transfer_id, from_account_number, to_account_number, amount)
+            except sqlite3.Error as e:
+                print(f"Could not complete transfer {transfer_id}: {e}")
+                continue
+            recovered += 1
+    for transfer_id, (to_account_number, amount) in credited.items():
+        def reverse(cursor):
+            cursor.execute("UPDATE transfer_inbox SET state = 'reversed' WHERE id = ? AND state = 'credited'", (transfer_id,))
+            if cursor.rowcount: _post(cursor, to_account_number, "Transfer In Reversal", amount, -amount, overdraw=True)
+        try:
+            with using(shard_for(to_account_number)): run_write(reverse)
+        except sqlite3.Error as e:
+            print(f"Could not reverse transfer {transfer_id}: {e}")
+            continue
+        reversed_credits += 1
+    if recovered: print(f"Completed {recovered} cross-shard transfers.")
+    if reversed_credits: print(f"Reversed {reversed_credits} cross-shard credits whose debit is missing.")
+    return recovered + reversed_credits
+@metrics.timed
+def prune_transfers(days=TRANSFER_RETENTION_DAYS):
+    """Delete settled outbox rows and inbox rows older than ``days``; returns how many.
+
+    Pending outbox rows are kept until delivered. Keeps the transfer tables, and
+    the startup recovery that reads them, from growing with every transfer made.
+    """
+    cutoff, pruned = _transfer_cutoff(days), 0
+    for path in shard_files() if SHARDS else ():
+        with using(path), atomic() as cursor:
+            cursor.execute("DELETE FROM transfer_outbox WHERE created < ? AND state != 'pending'", (cutoff,))
+            pruned += cursor.rowcount
+            cursor.execute("DELETE FROM transfer_inbox WHERE created < ?", (cutoff,))
+            pruned += cursor.rowcount
+    return pruned
+@metrics.timed
+def log_admin_action(admin_user, action, target_user, details=""):
+    try: run_write(lambda cursor: _audit(cursor, admin_user, action, target_user, details))
     except sqlite3.Error as e: print(f"Failed to write to audit log: {e}")
+def _audit(cursor, admin_user, action, target_user, details=""):
+    cursor.execute("INSERT INTO audit_log (timestamp, admin_user, action, target_user, details) VALUES (?, ?, ?, ?, ?)",
+                   (datetime.now().isoformat(), admin_user, action, target_user, details))
+@metrics.timed
 def get_audit_log():
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
+    with read_cursor() as cursor:
         cursor.execute("SELECT timestamp, admin_user, action, target_user, details FROM audit_log ORDER BY timestamp DESC")
         return cursor.fetchall()
+@metrics.timed
+def load_audit_page(before=None, limit=100, admin_user=None, action=None, target_user=None, start=None, end=None):
+    # Keyset pagination, newest first: `before` is the (timestamp, id) of the last row of
+    # the previous page. The other arguments filter on exact values or a start <= timestamp < end range.
+    sql = "SELECT id, timestamp, admin_user, action, target_user, details FROM audit_log WHERE 1 = 1"
+    params = []
+    for column, value in (("admin_user", admin_user), ("action", action), ("target_user", target_user)):
+        if value:
+            sql += f" AND {column} = ?"
+            params.append(value)
+    if before is not None:
+        sql += " AND (timestamp < ? OR (timestamp = ? AND id < ?))"
+        params += [before[0], before[0], before[1]]
+    if start is not None:
+        sql += " AND timestamp >= ?"
+        params.append(start.isoformat())
+    if end is not None:
+        sql += " AND timestamp < ?"
+        params.append(end.isoformat())
+    with read_cursor() as cursor:
+        cursor.execute(sql + " ORDER BY timestamp DESC, id DESC LIMIT ?", params + [limit])
+        return cursor.fetchall()
+def iter_audit_log(chunk_size=1000, **filters):
+    # Streams every matching audit row, newest first, one keyset page at a time.
+    before = None
+    while True:
+        rows = load_audit_page(before, chunk_size, **filters)
+        yield from rows
+        if len(rows) < chunk_size: return
+        before = (rows[-1][1], rows[-1][0])
+@metrics.timed
+def load_audit_actions():
+    with read_cursor() as cursor:
+        cursor.execute("SELECT DISTINCT action FROM audit_log ORDER BY action")
+        return [row[0] for row in cursor.fetchall()]
+@metrics.timed
 def get_interest_rate():
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
+    with read_cursor() as cursor:
         cursor.execute("SELECT value FROM system_config WHERE key = 'interest_rate'")
         return float(cursor.fetchone()[0])
+@metrics.timed
 def set_interest_rate(rate):
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
+    with atomic() as cursor:
         cursor.execute("UPDATE system_config SET value = ? WHERE key = 'interest_rate'", (str(rate),))
-        conn.commit()
\ No newline at end of file
+@metrics.timed
+def get_bcrypt_rounds():
+    with read_cursor() as cursor:
+        cursor.execute("SELECT value FROM system_config WHERE key = 'bcrypt_rounds'")
+        return int(cursor.fetchone()[0])
+@metrics.timed
+def set_bcrypt_rounds(rounds):
+    with atomic() as cursor:
+        cursor.execute("UPDATE system_config SET value = ? WHERE key = 'bcrypt_rounds'", (str(rounds),))
\ No newline at end of file
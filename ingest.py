@@ -0,0 +1,112 @@
+"""Bulk posting of payment files (payroll credits, bulk debits and transfers).
+
+Input is CSV with a header row or JSON Lines, one payment per record:
+
+    account_number  account to credit or debit (the sender for transfers)
+    amount          rupees, e.g. 1250.50
+    type            "credit" (default) or "debit"; ignored when to_account is set
+    to_account      optional; makes the record a transfer to this account
+
+Records are read lazily, validated against the known accounts and posted in
+chunks, each chunk in one transaction via executemany. Records that fail
+validation or would overdraw an account are written to a rejects CSV.
+
+    python ingest.py payroll.csv --rejects payroll_rejects.csv
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from decimal import InvalidOperation
+from itertools import islice
+
+import database_manager as db
+from models import MAX_AMOUNT_PAISE, from_paise, to_paise
+
+DEFAULT_CHUNK_SIZE = 5000
+REJECT_FIELDS = ["line", "account_number", "to_account", "amount", "type", "reason"]
+
+def read_payments(path):
+    """Yield ``(line_number, record)`` from a CSV or JSON Lines payment file.
+
+    A JSON line that does not parse is yielded as ``None``, so it is rejected
+    with its line number like any other invalid record.
+    """
+    with open(path, newline="") as file:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            for line_number, line in enumerate(file, start=1):
+                if not line.strip(): continue
+                try: yield line_number, json.loads(line)
+                except json.JSONDecodeError: yield line_number, None
+        else:
+            for line_number, record in enumerate(csv.DictReader(file), start=2):
+                yield line_number, record
+
+def to_posting(record, known_accounts):
+    """Return the legs for one record, or raise ValueError with the reason it is rejected."""
+    if record is None: raise ValueError("Line is not valid JSON.")
+    if not isinstance(record, dict): raise ValueError("Line is not a JSON object.")
+    account_number = str(record.get("account_number") or "").strip()
+    to_account = str(record.get("to_account") or "").strip()
+    kind = str(record.get("type") or "credit").strip().lower()
+    try: amount = to_paise(record.get("amount"))
+    except (InvalidOperation, TypeError, ValueError): raise ValueError("Amount is not a number.")
+    if amount <= 0: raise ValueError("Amount must be positive.")
+    if amount > MAX_AMOUNT_PAISE: raise ValueError(f"Amount exceeds the limit of INR {from_paise(MAX_AMOUNT_PAISE):.2f}.")
+    if account_number not in known_accounts: raise ValueError(f"Account {account_number or '(blank)'} not found.")
+    if to_account:
+        if to_account not in known_accounts: raise ValueError(f"Recipient account {to_account} not found.")
+        if to_account == account_number: raise ValueError("Cannot transfer to the same account.")
+        return [(account_number, "Transfer Out", amount, -amount), (to_account, "Transfer In", amount, amount)]
+    if kind == "credit": return [(account_number, "Deposit", amount, amount)]
+    if kind == "debit": return [(account_number, "Withdrawal", amount, -amount)]
+    raise ValueError(f"Unknown type '{kind}'.")
+
+def ingest_file(path, rejects_path=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Post every valid record of ``path``; returns ``(posted, rejected)`` counts."""
+    rejects_path = rejects_path or f"{os.path.splitext(path)[0]}_rejects.csv"
+    known_accounts = set(db.load_account_numbers(role='user'))
+    posted = rejected = 0
+    started = time.perf_counter()
+    records = read_payments(path)
+    with open(rejects_path, "w", newline="") as rejects_file:
+        rejects = csv.DictWriter(rejects_file, fieldnames=REJECT_FIELDS, extrasaction="ignore")
+        rejects.writeheader()
+        def reject(line_number, record, reason):
+            fields = record if isinstance(record, dict) else {}
+            rejects.writerow({**{k: fields.get(k, "") for k in REJECT_FIELDS}, "line": line_number, "reason": reason})
+        while chunk := list(islice(records, chunk_size)):
+            postings, sources = [], []
+            for line_number, record in chunk:
+                try: postings.append(to_posting(record, known_accounts))
+                except ValueError as e:
+                    reject(line_number, record, str(e))
+                    rejected += 1
+                    continue
+                sources.append((line_number, record))
+            failures = db.post_batch(postings)
+            if failures is None:
+                for line_number, record in sources: reject(line_number, record, "Database error; batch not posted.")
+                rejected += len(sources)
+                continue
+            for index, reason in failures: reject(*sources[index], reason)
+            rejected += len(failures)
+            posted += len(postings) - len(failures)
+            print(f"Posted {posted} records, rejected {rejected} ({posted / (time.perf_counter() - started):.0f} records/s)")
+    return posted, rejected
+
+def main():
+    parser = argparse.ArgumentParser(description="Post a CSV/JSONL payment file in bulk.")
+    parser.add_argument("path", help="Payment file (.csv, or .jsonl/.ndjson).")
+    parser.add_argument("--rejects", help="Where to write rejected records (defaults next to the input).")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Records per transaction.")
+    parser.add_argument("--db", default=db.DB_FILE, help="Database file to post into.")
+    args = parser.parse_args()
+    db.DB_FILE = args.db
+    db.init_database()
+    posted, rejected = ingest_file(args.path, args.rejects, args.chunk_size)
+    print(f"Done: {posted} posted, {rejected} rejected.")
+
+if __name__ == "__main__":
+    main()
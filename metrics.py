@@ -0,0 +1,141 @@
+"""Latency histograms and counters for BankSystem and database_manager.
+
+Functions wrapped with ``@timed`` record their latency under their qualified name
+(e.g. ``backend_logic.BankSystem.deposit``); ``timer(name)`` does the same for a
+block and ``count(name)`` bumps a counter. Calls slower than ``SLOW_SECONDS``
+are printed. Recording is off unless ``enable()`` is called or BANK_METRICS=1 is
+set; when off a wrapped call costs one flag check.
+
+Snapshots are available as Prometheus text (``prometheus_text``) or JSON
+(``snapshot``), and ``start_exporter`` rewrites a file with either every few
+seconds. BANK_METRICS_FILE=/path/metrics.prom (or .json) starts one via
+``configure_from_env``.
+"""
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_SECONDS = float(os.environ.get("BANK_METRICS_SLOW_MS", "100")) / 1000
+ENABLED = os.environ.get("BANK_METRICS", "") not in ("", "0")
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+    def observe(self, seconds, failed=False):
+        index = bisect.bisect_left(BUCKETS, seconds)
+        with self.lock:
+            self.counts[index] += 1
+            self.total += seconds
+            self.count += 1
+            if failed: self.errors += 1
+
+_histograms = {}
+_counters = {}
+_registry_lock = threading.Lock()
+
+def enable():
+    global ENABLED
+    ENABLED = True
+def disable():
+    global ENABLED
+    ENABLED = False
+def reset():
+    with _registry_lock:
+        _histograms.clear()
+        _counters.clear()
+
+def _histogram(name):
+    histogram = _histograms.get(name)
+    if histogram is None:
+        with _registry_lock: histogram = _histograms.setdefault(name, Histogram())
+    return histogram
+def observe(name, seconds, failed=False):
+    _histogram(name).observe(seconds, failed)
+    if seconds >= SLOW_SECONDS: print(f"Slow operation: {name} took {seconds * 1000:.1f} ms")
+def count(name, amount=1):
+    if not ENABLED: return
+    with _registry_lock: _counters[name] = _counters.get(name, 0) + amount
+
+def timed(func):
+    name = f"{func.__module__}.{func.__qualname__}"
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not ENABLED: return func(*args, **kwargs)
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = func(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            observe(name, time.perf_counter() - started, failed)
+    return wrapper
+@contextmanager
+def timer(name):
+    if not ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        observe(name, time.perf_counter() - started, failed)
+
+def snapshot():
+    with _registry_lock:
+        histograms, counters = list(_histograms.items()), dict(_counters)
+    operations = {}
+    for name, histogram in sorted(histograms):
+        with histogram.lock:
+            counts, total, calls, errors = list(histogram.counts), histogram.total, histogram.count, histogram.errors
+        operations[name] = {"count": calls, "errors": errors, "total_seconds": total,
+                            "mean_ms": 1000 * total / calls if calls else 0.0,
+                            "buckets": {str(bound): n for bound, n in zip(BUCKETS + ("+Inf",), counts)}}
+    return {"timestamp": time.time(), "operations": operations, "counters": counters}
+def prometheus_text():
+    data = snapshot()
+    lines = ["# HELP bank_operation_seconds Latency of BankSystem and database operations.",
+             "# TYPE bank_operation_seconds histogram"]
+    for name, op in data["operations"].items():
+        cumulative = 0
+        for bound, n in op["buckets"].items():
+            cumulative += n
+            lines.append(f'bank_operation_seconds_bucket{{operation="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'bank_operation_seconds_sum{{operation="{name}"}} {op["total_seconds"]}')
+        lines.append(f'bank_operation_seconds_count{{operation="{name}"}} {op["count"]}')
+    lines += ["# HELP bank_operation_errors_total Operations that raised.", "# TYPE bank_operation_errors_total counter"]
+    lines += [f'bank_operation_errors_total{{operation="{name}"}} {op["errors"]}' for name, op in data["operations"].items()]
+    lines += ["# HELP bank_events_total Counted events.", "# TYPE bank_events_total counter"]
+    lines += [f'bank_events_total{{event="{name}"}} {value}' for name, value in sorted(data["counters"].items())]
+    return "\n".join(lines) + "\n"
+def write_file(path):
+    # Written to a temporary file and renamed, so scrapers never read a partial file.
+    text = json.dumps(snapshot(), indent=2) if path.endswith(".json") else prometheus_text()
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as file: file.write(text)
+    os.replace(temporary, path)
+def start_exporter(path, interval=15):
+    def run():
+        while True:
+            time.sleep(interval)
+            try: write_file(path)
+            except OSError as e: print(f"Failed to write metrics to {path}: {e}")
+    thread = threading.Thread(target=run, name="metrics-exporter", daemon=True)
+    thread.start()
+    return thread
+def configure_from_env():
+    path = os.environ.get("BANK_METRICS_FILE")
+    if not path: return None
+    enable()
+    return start_exporter(path, float(os.environ.get("BANK_METRICS_INTERVAL", "15")))
@@ -1,11 +1,10 @@
 import os
-from datetime import datetime
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
+from array import array
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, ROUND_HALF_UP
 import csv
-import bcrypt
+import threading
 
 def is_strong_password(password):
     if len(password) < 8:
@@ -16,43 +15,205 @@ def is_strong_password(password):
         return False, "Password must contain at least one digit."
     return True, "Password is strong."
 
-def hash_password(password):
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+# Largest amount accepted for one posting or opening balance (INR 1 trillion), far below
+# the 64-bit INTEGER SQLite stores balances in.
+MAX_AMOUNT_PAISE = 100 * 10**12
+
+def to_paise(amount):
+    amount = Decimal(str(amount))
+    if not amount.is_finite(): raise ValueError("Amount must be a finite number.")
+    return int((amount * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+def from_paise(paise):
+    return Decimal(paise).scaleb(-2)
+
+def statement_period(start=None, end=None):
+    # Dates are whole days, so a date `end` includes that day; datetimes are used as given.
+    if isinstance(start, date) and not isinstance(start, datetime):
+        start = datetime.combine(start, time.min)
+    if isinstance(end, date) and not isinstance(end, datetime):
+        end = datetime.combine(end + timedelta(days=1), time.min)
+    return start, end
+
+# bcrypt and reportlab are imported where they are used: reportlab alone costs a
+# couple of hundred milliseconds at startup and is only needed for PDF statements.
+def hash_password(password, rounds=12):
+    import bcrypt
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+
+def password_cost(password_hash):
+    # bcrypt hashes look like $2b$<cost>$<salt+digest>.
+    try: return int(password_hash.split("$")[2])
+    except (IndexError, ValueError): return None
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+class TransactionPage:
+    """One page of ledger rows stored column-wise in typed arrays.
+
+    Dates are kept as integer microseconds since ``EPOCH`` (naive, like the ledger),
+    money as integer paise and transaction types as small codes into ``TYPES``, so
+    a row costs about 34 bytes instead of a tuple, a datetime and two ints.
+    Iterating yields ``(date, trans_type, amount_paise, balance_paise)`` tuples.
+    """
+    __slots__ = ("ids", "times", "types", "amounts", "balances")
+    TYPES = []
+    _type_codes = {}
+    _types_lock = threading.Lock()
+    def __init__(self, rows):
+        self.ids, self.times, self.amounts, self.balances = array("q"), array("q"), array("q"), array("q")
+        self.types = array("H")
+        for t_id, t_date, t_type, amount, balance in rows:
+            self.ids.append(t_id)
+            self.times.append((t_date - EPOCH) // MICROSECOND)
+            self.types.append(self._type_code(t_type))
+            self.amounts.append(amount)
+            self.balances.append(balance)
+    @classmethod
+    def _type_code(cls, t_type):
+        code = cls._type_codes.get(t_type)
+        if code is None:
+            with cls._types_lock:
+                code = cls._type_codes.get(t_type)
+                if code is None:
+                    code = cls._type_codes[t_type] = len(cls.TYPES)
+                    cls.TYPES.append(t_type)
+        return code
+    def __len__(self):
+        return len(self.ids)
+    def date(self, index):
+        return EPOCH + self.times[index] * MICROSECOND
+    def __iter__(self):
+        for index in range(len(self.ids)):
+            yield self.date(index), self.TYPES[self.types[index]], self.amounts[index], self.balances[index]
+    def last_key(self):
+        return self.date(-1).isoformat(), self.ids[-1]
+
+class TransactionHistory:
+    """Lazy, newest-first view of an account's ledger, fetched a page at a time.
+
+    ``fetch_page(account_number, before, limit)`` returns up to ``limit`` rows of
+    ``(id, date, trans_type, amount, balance)`` older than the ``(date, id)`` key
+    ``before``, with money in integer paise. Recently viewed pages are kept in a
+    small LRU cache as columnar ``TransactionPage``s; rows are handed out with
+    amounts as rupee ``Decimal``s.
+    The optional ``fetch_balance(account_number, when)`` answers point-in-time
+    balance lookups from the daily snapshots.
+    """
+    __slots__ = ("account_number", "_fetch_page", "_fetch_balance", "page_size", "max_cached_pages", "_pages", "_cursors")
+    def __init__(self, account_number, fetch_page, page_size=100, max_cached_pages=8, fetch_balance=None):
+        self.account_number = account_number
+        self._fetch_page = fetch_page
+        self._fetch_balance = fetch_balance
+        self.page_size = page_size
+        self.max_cached_pages = max_cached_pages
+        self.invalidate()
+    def invalidate(self):
+        self._pages = OrderedDict()
+        self._cursors = [None]
+    def append(self, transaction):
+        # The ledger row is written by the database layer; only drop stale pages here.
+        self.invalidate()
+    def page(self, index):
+        if index in self._pages:
+            self._pages.move_to_end(index)
+        else:
+            while len(self._cursors) <= index:
+                if len(self.page(len(self._cursors) - 1)) < self.page_size: return []
+            page = TransactionPage(self._fetch_page(self.account_number, self._cursors[index], self.page_size))
+            if len(page) == self.page_size and len(self._cursors) == index + 1:
+                self._cursors.append(page.last_key())
+            self._pages[index] = page
+            if len(self._pages) > self.max_cached_pages:
+                self._pages.popitem(last=False)
+        return [(t_date, t_type, from_paise(amount), from_paise(balance)) for t_date, t_type, amount, balance in self._pages[index]]
+    def keyed_page(self, before=None, limit=None):
+        # Uncached keyset page for views that track rows by ledger id; returns the rows as
+        # (id, transaction) pairs and the cursor for the next page (None after the last).
+        limit = limit or self.page_size
+        rows = self._fetch_page(self.account_number, before, limit)
+        next_before = (rows[-1][1].isoformat(), rows[-1][0]) if len(rows) == limit else None
+        return [(t_id, (t_date, t_type, from_paise(amount), from_paise(balance)))
+                for t_id, t_date, t_type, amount, balance in rows], next_before
+    def between(self, start=None, end=None, chunk_size=1000):
+        # Streams the rows with start <= date < end in keyset chunks, bypassing the page cache.
+        before = None
+        while True:
+            rows = self._fetch_page(self.account_number, before, chunk_size, start, end)
+            for _, t_date, t_type, amount, balance in rows:
+                yield t_date, t_type, from_paise(amount), from_paise(balance)
+            if len(rows) < chunk_size: return
+            before = (rows[-1][1].isoformat(), rows[-1][0])
+    def balance_at(self, when):
+        # Balance just before `when` (a date means its end of day), or None if unknown.
+        if self._fetch_balance is None: return None
+        balance = self._fetch_balance(self.account_number, when)
+        return None if balance is None else from_paise(balance)
+    def __iter__(self):
+        index = 0
+        while True:
+            rows = self.page(index)
+            yield from rows
+            if len(rows) < self.page_size: return
+            index += 1
 
 class Account:
+    __slots__ = ("name", "account_number", "balance_paise", "password_hash", "role", "failed_attempts", "is_locked", "transactions")
     MAX_FAILED_ATTEMPTS = 3
-    def __init__(self, name, account_number, balance, password_hash, role='user', failed_attempts=0, is_locked=0):
+    STATEMENT_ROWS_PER_TABLE = 30
+    STATEMENT_HEADER = ["Date & Time", "Transaction Type", "Amount", "Balance"]
+    def __init__(self, name, account_number, balance_paise, password_hash, role='user', failed_attempts=0, is_locked=0):
         self.name = name
         self.account_number = account_number
-        self.balance = float(balance)
+        self.balance_paise = int(balance_paise)
         self.password_hash = password_hash
         self.role = role
         self.failed_attempts = int(failed_attempts)
         self.is_locked = bool(is_locked)
         self.transactions = []
+    @classmethod
+    def from_row(cls, row):
+        acc_num, name, balance, pwd_hash, role, f_attempts, locked = row
+        return cls(name, acc_num, balance, pwd_hash, role, f_attempts, locked)
+    @property
+    def balance(self):
+        return from_paise(self.balance_paise)
     def verify_password(self, password):
+        import bcrypt
         return bcrypt.checkpw(password.encode(), self.password_hash.encode())
     def deposit(self, value):
+        value = to_paise(value)
         if value <= 0:
             print("Deposit amount must be positive!")
             return None
-        self.balance += value
-        transaction = (datetime.now(), "Deposit", value, self.balance)
+        if value > MAX_AMOUNT_PAISE:
+            print("Deposit amount is over the limit!")
+            return None
+        self.balance_paise += value
+        transaction = (datetime.now(), "Deposit", value, self.balance_paise)
         self.transactions.append(transaction)
-        print(f"Deposited: {value:.2f}. New Balance: {self.balance:.2f}")
+        print(f"Deposited: {from_paise(value):.2f}. New Balance: {self.balance:.2f}")
         return transaction
     def withdraw(self, value):
+        value = to_paise(value)
         if value <= 0:
             print("Withdrawal amount must be positive!")
             return None
-        if value > self.balance:
+        if value > MAX_AMOUNT_PAISE:
+            print("Withdrawal amount is over the limit!")
+            return None
+        if value > self.balance_paise:
             print("Balance Insufficient!")
             return None
-        self.balance -= value
-        transaction = (datetime.now(), "Withdrawal", value, self.balance)
+        self.balance_paise -= value
+        transaction = (datetime.now(), "Withdrawal", value, self.balance_paise)
         self.transactions.append(transaction)
-        print(f"Withdrawn: {value:.2f}. New Balance: {self.balance:.2f}")
+        print(f"Withdrawn: {from_paise(value):.2f}. New Balance: {self.balance:.2f}")
         return transaction
+    def apply_transaction(self, transaction):
+        self.balance_paise = transaction[3]
+        self.transactions.append(transaction)
     def increment_failed_attempts(self):
         self.failed_attempts += 1
         if self.failed_attempts >= self.MAX_FAILED_ATTEMPTS:
@@ -72,26 +233,46 @@ class Account:
         print(f"Bank Balance: INR {self.balance:.2f}")
         print(f"Account Status: {'Locked' if self.is_locked else 'Active'}")
         print("-----------------------")
-    def generate_statement(self):
-        pdf_file = f"Bank_Statement_{self.account_number}.pdf"
-        doc = SimpleDocTemplate(pdf_file, pagesize=letter)
-        elements = []
+    def generate_statement(self, start=None, end=None, directory=""):
+        # Rows are streamed from the ledger into one small table at a time, and each table is
+        # drawn onto the canvas as soon as it is full, so memory does not grow with the ledger.
+        from reportlab.lib import colors
+        from reportlab.lib.pagesizes import letter
+        from reportlab.lib.styles import getSampleStyleSheet
+        from reportlab.lib.units import inch
+        from reportlab.pdfgen import canvas
+        from reportlab.platypus import Paragraph, Table, TableStyle
+        start, end = statement_period(start, end)
+        pdf_file = os.path.join(directory, f"Bank_Statement_{self.account_number}.pdf")
+        pdf = canvas.Canvas(pdf_file, pagesize=letter)
+        page_width, page_height = letter
+        frame_width, frame_height = page_width - 2 * inch, page_height - 2 * inch
+        top = page_height - inch
+        def draw(flowable, centered=False):
+            nonlocal top
+            width, height = flowable.wrapOn(pdf, frame_width, frame_height)
+            if top - height < inch:
+                pdf.showPage()
+                top = page_height - inch
+            flowable.drawOn(pdf, inch + ((frame_width - width) / 2 if centered else 0), top - height)
+            top -= height + 6
         styles = getSampleStyleSheet()
-        elements.append(Paragraph("Bank Statement", styles['Heading1']))
-        elements.append(Paragraph(f"Account Holder's Name: {self.name}", styles['Normal']))
-        elements.append(Paragraph(f"Account Number: {self.account_number}", styles['Normal']))
-        elements.append(Paragraph(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal']))
-        elements.append(Paragraph("<br/><br/>", styles['Normal']))
-        data = [["Date & Time", "Transaction Type", "Amount", "Balance"]]
-        for t_date, t_type, t_amount, t_balance in self.transactions:
-            data.append([
-                t_date.strftime("%Y-%m-%d %H:%M:%S"),
-                t_type,
-                f"INR {t_amount:.2f}",
-                f"INR {t_balance:.2f}"
-            ])
-        table = Table(data)
-        style = TableStyle([
+        draw(Paragraph("Bank Statement", styles['Heading1']))
+        draw(Paragraph(f"Account Holder's Name: {self.name}", styles['Normal']))
+        draw(Paragraph(f"Account Number: {self.account_number}", styles['Normal']))
+        if start or end:
+            period_from = start.strftime('%Y-%m-%d %H:%M') if start else "opening"
+            period_to = (end - timedelta(microseconds=1)).strftime('%Y-%m-%d %H:%M') if end else "today"
+            draw(Paragraph(f"Period: {period_from} to {period_to}", styles['Normal']))
+            if start:
+                opening = self.transactions.balance_at(start)
+                if opening is not None: draw(Paragraph(f"Opening Balance: INR {opening:.2f}", styles['Normal']))
+            if end:
+                closing = self.transactions.balance_at(end)
+                if closing is not None: draw(Paragraph(f"Closing Balance: INR {closing:.2f}", styles['Normal']))
+        draw(Paragraph(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal']))
+        draw(Paragraph("<br/><br/>", styles['Normal']))
+        base_style = [
             ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
             ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
             ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
@@ -99,22 +280,34 @@ class Account:
             ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
             ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
             ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ])
-        table.setStyle(style)
-        for i, row in enumerate(self.transactions, start=1):
-            if row[1] in ["Deposit", "Initial Deposit", "Transfer In"]:
-                table.setStyle(TableStyle([('BACKGROUND', (0, i), (-1, i), colors.lightgreen)]))
-            elif row[1] in ["Withdrawal", "Transfer Out"]:
-                table.setStyle(TableStyle([('BACKGROUND', (0, i), (-1, i), colors.lightcoral)]))
-        elements.append(table)
-        doc.build(elements)
+        ]
+        data, row_styles, tables = [self.STATEMENT_HEADER], [], 0
+        for t_date, t_type, t_amount, t_balance in self.transactions.between(start, end):
+            i = len(data)
+            data.append([
+                t_date.strftime("%Y-%m-%d %H:%M:%S"),
+                t_type,
+                f"INR {t_amount:.2f}",
+                f"INR {t_balance:.2f}"
+            ])
+            if t_type in ["Deposit", "Initial Deposit", "Transfer In"]:
+                row_styles.append(('BACKGROUND', (0, i), (-1, i), colors.lightgreen))
+            elif t_type in ["Withdrawal", "Transfer Out"]:
+                row_styles.append(('BACKGROUND', (0, i), (-1, i), colors.lightcoral))
+            if i == self.STATEMENT_ROWS_PER_TABLE:
+                draw(Table(data, style=TableStyle(base_style + row_styles)), centered=True)
+                data, row_styles, tables = [self.STATEMENT_HEADER], [], tables + 1
+        if len(data) > 1 or not tables:
+            draw(Table(data, style=TableStyle(base_style + row_styles)), centered=True)
+        pdf.save()
         return pdf_file
-    def export_to_csv(self):
-        csv_file = f"Transactions_{self.account_number}.csv"
+    def export_to_csv(self, start=None, end=None, directory=""):
+        start, end = statement_period(start, end)
+        csv_file = os.path.join(directory, f"Transactions_{self.account_number}.csv")
         with open(csv_file, mode='w', newline='') as file:
             writer = csv.writer(file)
-            writer.writerow(["Date & Time", "Transaction Type", "Amount", "Balance"])
-            for t_date, t_type, t_amount, t_balance in self.transactions:
+            writer.writerow(self.STATEMENT_HEADER)
+            for t_date, t_type, t_amount, t_balance in self.transactions.between(start, end):
                 writer.writerow([
                     t_date.strftime("%Y-%m-%d %H:%M:%S"),
                     t_type,
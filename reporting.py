@@ -0,0 +1,65 @@
+"""Whole-bank metrics for the admin dashboard.
+
+Every figure is a set-based SQL aggregate, so nothing here loads accounts or
+ledger rows into Python. Results are cached for ``CACHE_TTL_SECONDS`` and dropped
+as soon as this process commits a write (``database_manager.write_generation``);
+the TTL bounds staleness when another process, such as ``ingest.py``, writes.
+"""
+import math
+import threading
+import time
+from datetime import date, timedelta
+
+import database_manager as db
+from models import from_paise
+
+CACHE_TTL_SECONDS = 30
+# Money entering and leaving the bank; transfers between accounts net to zero and
+# are only reported in totals_by_type.
+CREDIT_TYPES = ("Initial Deposit", "Deposit", "Credit Interest")
+DEBIT_TYPES = ("Withdrawal",)
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def _cached(key, compute):
+    now, generation = time.monotonic(), db.write_generation()
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry and entry[0] == generation and entry[1] > now: return entry[2]
+    value = compute()
+    with _cache_lock: _cache[key] = (generation, now + CACHE_TTL_SECONDS, value)
+    return value
+def clear_cache():
+    with _cache_lock: _cache.clear()
+
+def bank_totals():
+    def compute():
+        accounts, locked, total, low, high = db.load_bank_totals()
+        return {"accounts": accounts, "locked_accounts": locked, "total_balance": from_paise(total),
+                "average_balance": from_paise(total // accounts) if accounts else from_paise(0),
+                "smallest_balance": from_paise(low or 0), "largest_balance": from_paise(high or 0)}
+    return _cached(("totals",), compute)
+def totals_by_type(days=30):
+    since = date.today() - timedelta(days=days - 1)
+    return _cached(("by_type", since), lambda: [(t_type, count, from_paise(total)) for t_type, count, total in db.load_totals_by_type(since)])
+def daily_flows(days=30):
+    # (day, inflow, outflow, net) for each day with activity in the last `days` days.
+    since = date.today() - timedelta(days=days - 1)
+    return _cached(("flows", since), lambda: [
+        (day, from_paise(inflow), from_paise(outflow), from_paise(inflow - outflow))
+        for day, inflow, outflow in db.load_daily_flows(since, CREDIT_TYPES, DEBIT_TYPES)])
+def top_accounts(limit=10):
+    return _cached(("top", limit), lambda: [(acc, name, from_paise(balance)) for acc, name, balance in db.load_top_balances(limit)])
+def balance_histogram(bins=10):
+    # (low, high, count) for `bins` equal-width balance ranges between the smallest and largest balance.
+    def compute():
+        accounts, _, _, low, high = db.load_bank_totals()
+        if not accounts: return []
+        width = max(1, math.ceil((high - low + 1) / bins / 100)) * 100
+        counts = dict(db.load_balance_histogram(low, width))
+        return [(from_paise(low + i * width), from_paise(low + (i + 1) * width - 1), counts.get(i, 0)) for i in range(bins)]
+    return _cached(("histogram", bins), compute)
+def dashboard(days=30, top=10, bins=10):
+    return {"totals": bank_totals(), "by_type": totals_by_type(days), "daily_flows": daily_flows(days),
+            "top_accounts": top_accounts(top), "histogram": balance_histogram(bins)}
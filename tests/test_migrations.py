@@ -0,0 +1,59 @@
+import multiprocessing
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+import database_manager as db
+
+LEGACY_SCHEMA = """
+    CREATE TABLE accounts (account_number TEXT PRIMARY KEY, name TEXT NOT NULL, balance REAL NOT NULL,
+                           password_hash TEXT NOT NULL, role TEXT NOT NULL DEFAULT 'user',
+                           failed_attempts INTEGER NOT NULL DEFAULT 0, is_locked INTEGER NOT NULL DEFAULT 0);
+    CREATE TABLE transactions (id INTEGER PRIMARY KEY AUTOINCREMENT, account_number TEXT NOT NULL, date TEXT NOT NULL,
+                               trans_type TEXT NOT NULL, amount REAL NOT NULL, balance REAL NOT NULL);
+    CREATE TABLE audit_log (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, admin_user TEXT NOT NULL,
+                            action TEXT NOT NULL, target_user TEXT, details TEXT);
+    CREATE TABLE system_config (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+    INSERT INTO accounts VALUES ('C1', 'Customer', 1025.57, 'hash', 'user', 0, 0);
+    INSERT INTO transactions (account_number, date, trans_type, amount, balance)
+        VALUES ('C1', '2024-01-01T10:00:00', 'Initial Deposit', 1025.57, 1025.57);
+"""
+
+def _migrate(path, read_flag=None, go_flag=None):
+    db.DB_FILE = path
+    if read_flag:
+        # Pause after reading user_version until the other process has migrated.
+        original = db.read_cursor
+        @contextmanager
+        def pausing_read_cursor():
+            with original() as cursor: yield cursor
+            open(read_flag, "w").close()
+            while not os.path.exists(go_flag): time.sleep(0.01)
+        db.read_cursor = pausing_read_cursor
+    db.migrate_database()
+
+def _wait_for(path, process):
+    deadline = time.monotonic() + 30
+    while not os.path.exists(path):
+        assert process.is_alive() and time.monotonic() < deadline
+        time.sleep(0.01)
+
+def test_concurrent_migrations_apply_each_step_once(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    with sqlite3.connect(path) as conn: conn.executescript(LEGACY_SCHEMA)
+    read_flag, go_flag = str(tmp_path / "read"), str(tmp_path / "go")
+    context = multiprocessing.get_context("fork")
+    slow = context.Process(target=_migrate, args=(path, read_flag, go_flag))
+    slow.start()
+    _wait_for(read_flag, slow)
+    fast = context.Process(target=_migrate, args=(path,))
+    fast.start()
+    fast.join(30)
+    open(go_flag, "w").close()
+    slow.join(30)
+    assert fast.exitcode == 0 and slow.exitcode == 0
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(db.MIGRATIONS)
+        assert conn.execute("SELECT balance FROM accounts").fetchone()[0] == 102557
+        assert conn.execute("SELECT amount, balance FROM transactions").fetchone() == (102557, 102557)
@@ -0,0 +1,113 @@
+import glob
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import database_manager as db
+from models import Account
+
+@pytest.fixture
+def sharded(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_FILE", str(tmp_path / "bank.db"))
+    monkeypatch.setattr(db, "SHARDS", 2)
+    db.init_database()
+    accounts = [f"T{i}" for i in range(10)]
+    for number in accounts:
+        account = Account("Tester", number, 100000, "hash")
+        account.transactions.append((datetime.now(), "Initial Deposit", 100000, 100000))
+        db.create_new_account(account)
+    sender = accounts[0]
+    recipient = next(number for number in accounts if db.shard_for(number) != db.shard_for(sender))
+    yield tmp_path, sender, recipient
+    db.close_connections()
+
+def _restore(backups, stamps):
+    # Each file comes back from the backup named for it in `stamps` (None for DB_FILE).
+    db.close_connections()
+    for path in glob.glob(f"{os.path.splitext(db.DB_FILE)[0]}*.db*"): os.remove(path)
+    for index, path in enumerate(db.database_files()):
+        suffix = f"_shard{index - 1}" if index else ""
+        shutil.copy(os.path.join(backups, f"{db.BACKUP_PREFIX}{stamps[path]}{suffix}.db"), path)
+
+def _stamp(backup):
+    return os.path.basename(backup)[len(db.BACKUP_PREFIX):-len(".db")]
+
+@pytest.mark.parametrize("debit_restored", [True, False])
+def test_restore_from_backups_taken_around_a_transfer_conserves_money(sharded, debit_restored):
+    tmp_path, sender, recipient = sharded
+    backups = str(tmp_path / "backups")
+    total = sum(db.load_balances().values())
+    before = _stamp(db.backup_database(backups))
+    assert db.execute_transfer(sender, recipient, 2500)[1] is not None
+    after = _stamp(db.backup_database(backups))
+    # Restoring the sender's shard from after the transfer and the recipient's from before
+    # it loses the credit; the other way round keeps a credit whose debit is gone.
+    stamps = {db.DB_FILE: after, db.shard_for(sender): after if debit_restored else before,
+              db.shard_for(recipient): before if debit_restored else after}
+    _restore(backups, stamps)
+    db.init_database()
+    db.recover_transfers(reconcile=True)
+    balances = db.load_balances()
+    assert sum(balances.values()) == total
+    expected = (97500, 102500) if debit_restored else (100000, 100000)
+    assert (balances[sender], balances[recipient]) == expected
+    assert db.recover_transfers(reconcile=True) == 0
+
+def test_refunded_transfer_whose_credit_survives_is_reversed(sharded):
+    tmp_path, sender, recipient = sharded
+    total = sum(db.load_balances().values())
+    assert db.execute_transfer(sender, recipient, 2500)[1] is not None
+    # As if the sender's shard came back from a copy where delivery had failed and was refunded.
+    with db.using(db.shard_for(sender)), db.atomic() as cursor:
+        cursor.execute("UPDATE transfer_outbox SET state = 'refunded'")
+        db._post(cursor, sender, "Transfer Reversal", 2500, 2500)
+    assert db.recover_transfers(reconcile=True) == 1
+    balances = db.load_balances()
+    assert sum(balances.values()) == total
+    assert (balances[sender], balances[recipient]) == (100000, 100000)
+
+def test_concurrent_deliveries_credit_the_recipient_once(sharded, monkeypatch):
+    tmp_path, sender, recipient = sharded
+    transfer_id = "concurrent"
+    with db.using(db.shard_for(sender)), db.atomic() as cursor:
+        db._post(cursor, sender, "Transfer Out", 100, -100)
+        cursor.execute("INSERT INTO transfer_outbox (id, created, from_account, to_account, amount) VALUES (?, ?, ?, ?, ?)",
+                       (transfer_id, datetime.now().isoformat(), sender, recipient, 100))
+    post = db._post
+    def slow_post(cursor, *args, **kwargs):
+        # Widen the window between the inbox check and the inbox insert.
+        time.sleep(0.05)
+        return post(cursor, *args, **kwargs)
+    monkeypatch.setattr(db, "_post", slow_post)
+    start = threading.Barrier(2)
+    def deliver():
+        start.wait()
+        try: db._deliver_transfer(transfer_id, sender, recipient, 100)
+        finally: db.close_connections()
+    threads = [threading.Thread(target=deliver) for _ in range(2)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    with db.using(db.shard_for(recipient)):
+        assert db._select("SELECT COUNT(*) FROM transactions WHERE account_number = ? AND trans_type = 'Transfer In'",
+                          (recipient,)) == [(1,)]
+    assert db.load_balances([recipient])[recipient] == 100100
+
+def test_prune_keeps_pending_and_recent_transfers(sharded):
+    tmp_path, sender, recipient = sharded
+    assert db.execute_transfer(sender, recipient, 100)[1] is not None
+    assert db.execute_transfer(sender, recipient, 200)[1] is not None
+    old = (datetime.now() - timedelta(days=db.TRANSFER_RETENTION_DAYS + 1)).isoformat()
+    with db.using(db.shard_for(sender)), db.atomic() as cursor:
+        cursor.execute("UPDATE transfer_outbox SET created = ?", (old,))
+        cursor.execute("UPDATE transfer_outbox SET state = 'pending' WHERE amount = 200")
+    with db.using(db.shard_for(recipient)), db.atomic() as cursor:
+        cursor.execute("UPDATE transfer_inbox SET created = ? WHERE amount = 100", (old,))
+    assert db.prune_transfers() == 2
+    with db.using(db.shard_for(sender)):
+        assert db._select("SELECT amount, state FROM transfer_outbox") == [(200, "pending")]
+    with db.using(db.shard_for(recipient)):
+        assert db._select("SELECT amount FROM transfer_inbox") == [(200,)]